@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import data_store
+from model_engine import load_training_frame, lagged_design, select_lag_order, ols_var, var_forecast, CONFIG_FILE
+
+# --- CONFIGURATION ---
+RESULTS_DIR = "cache/backtests"
+TARGET = 'FDI_Inflows_MillionUSD'
+MAX_LAGS = 12          # Same ceiling as model_engine.fit_var
+SIGNAL_WINDOW = 12     # Months averaged on each side of the HEATING UP / COOLING DOWN rule
+BATCH_SIZE = 25        # Origins per worker task (one lagged design is shared by the batch)
+
+
+def _run_id(countries, horizon, window, window_size, min_train, step):
+    """Identifies a backtest configuration on a given dataset version (used for resuming)."""
+    spec = json.dumps({
+        'countries': sorted(countries), 'horizon': horizon, 'window': window,
+        'window_size': window_size, 'min_train': min_train, 'step': step,
+        'data': data_store.dataset_version(),
+    }, sort_keys=True)
+    return hashlib.sha1(spec.encode("utf-8")).hexdigest()[:12]
+
+
+def _load_completed(path):
+    """Reads finished (country, origin) records; a half-written last line is ignored."""
+    records = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def _trim_partial_line(path):
+    """Drops a half-written trailing record so new records start on a fresh line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def _backtest_batch(args):
+    """
+    Refits the VAR at each origin of a batch and scores the forecast against the realised path.
+    The lagged design matrix is built once per batch; every origin reuses row slices of it.
+    """
+    country_name, origins, horizon, window, window_size = args
+    train_df, error = load_training_frame(country_name)
+    if error:
+        return []
+
+    values = train_df.values.astype(float)
+    target_idx = list(train_df.columns).index(TARGET)
+    X = lagged_design(values, MAX_LAGS)
+
+    records = []
+    for origin in origins:
+        start = 0 if window == "expanding" else origin - window_size
+        n_train = origin - start
+
+        # Same lag ceiling rule as model_engine.fit_var
+        maxlags = max(1, min(MAX_LAGS, n_train // 10))
+        try:
+            lag_order = select_lag_order(values, maxlags, X=X, start=start, end=origin)[0]['aic']
+            params, _ = ols_var(values, lag_order, X=X, start=start, end=origin)
+        except (ValueError, np.linalg.LinAlgError):
+            lag_order = 1
+            params, _ = ols_var(values, lag_order, X=X, start=start, end=origin)
+
+        predicted = var_forecast(params, values[start:origin], lag_order, horizon)[:, target_idx]
+        actual = values[origin:origin + horizon, target_idx]
+        errors = predicted - actual
+
+        # Signal hit: did the forecast call the direction of the next 12 months correctly?
+        avg_hist = values[max(start, origin - SIGNAL_WINDOW):origin, target_idx].mean()
+        called_up = predicted[:SIGNAL_WINDOW].mean() > avg_hist
+        was_up = actual[:SIGNAL_WINDOW].mean() > avg_hist
+
+        records.append({
+            'country': country_name,
+            'origin': str(train_df.index[origin].date()),
+            'lag_order': int(lag_order),
+            'ape': (np.abs(errors) / np.abs(actual) * 100).tolist(),
+            'sq_err': (errors ** 2).tolist(),
+            'signal_hit': bool(called_up == was_up),
+        })
+    return records
+
+
+def summarize(records):
+    """
+    Returns (metrics, hit_rates):
+      metrics   -> DataFrame indexed by (Country, Horizon) with MAPE, RMSE and origin count
+      hit_rates -> Series of HEATING UP / COOLING DOWN hit rates per country
+    """
+    if not records:
+        return pd.DataFrame(columns=['MAPE', 'RMSE', 'Origins']), pd.Series(dtype=float)
+
+    rows = []
+    for rec in records:
+        for h, (ape, sq) in enumerate(zip(rec['ape'], rec['sq_err']), start=1):
+            rows.append((rec['country'], h, ape, sq))
+    long_df = pd.DataFrame(rows, columns=['Country', 'Horizon', 'APE', 'SqErr'])
+
+    grouped = long_df.groupby(['Country', 'Horizon'])
+    metrics = pd.DataFrame({
+        'MAPE': grouped['APE'].mean(),
+        'RMSE': np.sqrt(grouped['SqErr'].mean()),
+        'Origins': grouped['APE'].size(),
+    })
+
+    hits = pd.DataFrame([(r['country'], r['signal_hit']) for r in records], columns=['Country', 'Hit'])
+    hit_rates = hits.groupby('Country')['Hit'].mean().rename('Signal_Hit_Rate')
+    return metrics, hit_rates
+
+
+def run_backtest(countries=None, horizon=12, window="expanding", window_size=120,
+                 min_train=60, step=1, max_workers=None, results_dir=RESULTS_DIR):
+    """
+    Rolling-origin backtest: replays history, refitting the VAR at every origin.
+    window="expanding" trains on all data before the origin; "sliding" on the last `window_size` months.
+    Completed origins are appended to an on-disk store, so an interrupted run resumes where it stopped.
+    Returns: (metrics, hit_rates) as produced by summarize().
+    """
+    if window not in ("expanding", "sliding"):
+        raise ValueError("window must be 'expanding' or 'sliding'")
+    if countries is None:
+        countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+    if window == "sliding":
+        min_train = max(min_train, window_size)
+
+    os.makedirs(results_dir, exist_ok=True)
+    run_id = _run_id(countries, horizon, window, window_size, min_train, step)
+    store_path = os.path.join(results_dir, f"backtest_{run_id}.jsonl")
+
+    _trim_partial_line(store_path)
+    records = _load_completed(store_path)
+    done = {(r['country'], r['origin']) for r in records}
+
+    # Build the outstanding work: origins are row positions of the first forecast month
+    tasks = []
+    for country_name in countries:
+        train_df, error = load_training_frame(country_name)
+        if error:
+            print(f"[WARN] Skipping {country_name}: {error}")
+            continue
+        origins = [
+            o for o in range(min_train, len(train_df) - horizon + 1, step)
+            if (country_name, str(train_df.index[o].date())) not in done
+        ]
+        for i in range(0, len(origins), BATCH_SIZE):
+            tasks.append((country_name, origins[i:i + BATCH_SIZE], horizon, window, window_size))
+
+    if tasks:
+        print(f"[INFO] Backtest {run_id}: {len(done)} origins cached, {sum(len(t[1]) for t in tasks)} to run.")
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool, \
+                open(store_path, "a", encoding="utf-8") as store:
+            futures = [pool.submit(_backtest_batch, task) for task in tasks]
+            for future in as_completed(futures):
+                batch = future.result()
+                for rec in batch:
+                    store.write(json.dumps(rec) + "\n")
+                store.flush()
+                records.extend(batch)
+
+    return summarize(records)
+
+
+if __name__ == "__main__":
+    print("🧪 Running rolling-origin backtest (expanding window, 12-month horizon)...")
+    metrics, hit_rates = run_backtest()
+    print(metrics.groupby(level='Country')[['MAPE', 'RMSE']].mean())
+    print(hit_rates)
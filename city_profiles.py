@@ -0,0 +1,92 @@
+import os
+import json
+import threading
+import pandas as pd
+
+# --- CONFIGURATION ---
+CITIES_DIR = "data/cities"
+CITIES_FILE = "cities.csv"   # One row per market city: centre, zoom and bbox
+POIS_FILE = "pois.geojson"   # Point features with properties.role = asset | competitor | site
+DEMAND_FILE = "demand.csv"   # Lat, Lon, Weight (+ optional Label): residential demand points
+DEFAULT_CITY = "Harare"
+
+# Parsed profiles keyed by city, reloaded only when one of the city's files changes
+_profiles = {}
+_lock = threading.Lock()
+
+
+def city_slug(city):
+    """File-system name for a city, e.g. 'South Africa' -> 'south_africa'."""
+    return "".join(ch if ch.isalnum() else "_" for ch in city.lower())
+
+
+def city_dir(city, cities_dir=CITIES_DIR):
+    """Folder holding one city's POI and demand files, e.g. data/cities/harare."""
+    return os.path.join(cities_dir, city_slug(city))
+
+
+def load_cities(cities_dir=CITIES_DIR):
+    """The city table (City, Country, centre, zoom, bbox), indexed by City."""
+    return pd.read_csv(os.path.join(cities_dir, CITIES_FILE)).set_index('City')
+
+
+def has_poi_data(city, cities_dir=CITIES_DIR):
+    """True when the city has both a POI file and a demand file."""
+    folder = city_dir(city, cities_dir)
+    return os.path.exists(os.path.join(folder, POIS_FILE)) and os.path.exists(os.path.join(folder, DEMAND_FILE))
+
+
+def _read_pois(path):
+    """Splits a GeoJSON FeatureCollection into {role: [{'name', 'loc': [lat, lon], ...}]}."""
+    with open(path, encoding="utf-8") as f:
+        collection = json.load(f)
+
+    pois = {'asset': [], 'competitor': [], 'site': []}
+    for feature in collection['features']:
+        props = dict(feature['properties'])
+        role = props.pop('role')
+        if role not in pois:
+            raise ValueError(f"{path}: unknown POI role '{role}' (expected {sorted(pois)})")
+        lon, lat = feature['geometry']['coordinates'][:2]  # GeoJSON order is [lon, lat]
+        pois[role].append({'name': props.pop('name'), 'loc': [lat, lon], **props})
+    return pois
+
+
+def load_city(city, cities_dir=CITIES_DIR):
+    """
+    One city's spatial inputs as a profile dict:
+    name, country, center, zoom, bbox, terrace_assets, competitors, residential_density, potential_sites.
+    Cached per process; re-read when the city table or the city's files change.
+    Raises FileNotFoundError when the city has no POI/demand files.
+    """
+    cities = load_cities(cities_dir)
+    if city not in cities.index:
+        raise KeyError(f"Unknown city '{city}'. Known: {list(cities.index)}")
+
+    folder = city_dir(city, cities_dir)
+    paths = [os.path.join(cities_dir, CITIES_FILE), os.path.join(folder, POIS_FILE), os.path.join(folder, DEMAND_FILE)]
+    stamp = tuple(os.stat(p).st_mtime_ns for p in paths)  # Raises FileNotFoundError if missing
+
+    with _lock:
+        cached = _profiles.get((cities_dir, city))
+        if cached is not None and cached['stamp'] == stamp:
+            return cached['profile']
+
+    row = cities.loc[city]
+    pois = _read_pois(paths[1])
+    demand = pd.read_csv(paths[2])
+    profile = {
+        'name': city,
+        'country': row['Country'],
+        'center': [float(row['Center_Lat']), float(row['Center_Lon'])],
+        'zoom': int(row['Zoom']),
+        'bbox': (float(row['Lat_Min']), float(row['Lon_Min']), float(row['Lat_Max']), float(row['Lon_Max'])),
+        'terrace_assets': pois['asset'],
+        'competitors': pois['competitor'],
+        'residential_density': demand[['Lat', 'Lon', 'Weight']].values.tolist(),
+        'potential_sites': pois['site'],
+    }
+
+    with _lock:
+        _profiles[(cities_dir, city)] = {'stamp': stamp, 'profile': profile}
+    return profile
@@ -1,80 +1,102 @@
+"""
+ETL pipeline for the semi-synthetic FDI panel: monthly market drivers (Yahoo, via the local
+driver cache) plus seeded synthetic country series, written as CSV and a columnar copy.
+
+Two ways to build it:
+  - full regeneration (--full, or changed profiles/seed): one legacy RandomState stream for the
+    whole history, so the bundled dataset is reproduced exactly;
+  - incremental refresh: synthetic rows for the new months only, with one stream per month.
+The two draw different noise for the same months, so rows appended by a refresh are NOT the
+rows a later --full run produces for those months: a full rebuild rewrites that recent history.
+"""
 import pandas as pd
 import numpy as np
-import yfinance as yf
 import os
 import datetime
+import hashlib
+import json
+import argparse
+import csv
+import shutil
+from market_data import DriverCache, YahooProvider, TICKERS
+from instrumentation import stage, timed, print_summary
+
+# Optional: columnar panel export (the CSV is always written)
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = feather = None
 
 # --- CONFIGURATION ---
 START_DATE = "2005-01-01"
 # DYNAMIC END DATE: Always fetches data up to the current moment (Today)
 END_DATE = datetime.datetime.today().strftime('%Y-%m-%d')
 CONFIG_FILE = "config_countries.csv"
+OUTPUT_FILE = "data/semi_synthetic_fdi.csv"
+PANEL_DIR = "data/fdi_panel"  # One Feather file per Country + _manifest.json
+STATE_FILE = "data/generator_state.json"  # Z-score statistics & last generated month (incremental runs)
+SEED = 42
 
-print(f"[INFO] System Start. Fetching data from {START_DATE} to {END_DATE} (Today)...")
+DRIVER_COLS = ['Oil_Price', 'USD_Index', 'Gold_Price', 'Platinum_Price']
+MINERAL_ECONOMIES = ['South Africa', 'Zimbabwe']     # GDP driven by Gold & Platinum
+HIGH_INFLATION_ECONOMIES = ['Nigeria', 'Egypt']      # Higher inflation baseline
+FINAL_COLS = ['Date', 'Country', 'FDI_Inflows_MillionUSD', 'GDP_Growth', 'Inflation', 'Interest_Rate',
+              'Oil_Price', 'USD_Index', 'Gold_Price', 'Platinum_Price']
 
-os.makedirs('data', exist_ok=True)
 
 # 1. LOAD COUNTRY CONFIGURATION
-print(f"[INFO] Loading Country Profiles from {CONFIG_FILE}...")
+def load_profiles(config_file=CONFIG_FILE):
+    """Reads the country profiles CSV (one row per market) and validates its columns."""
+    if not os.path.exists(config_file):
+        raise FileNotFoundError(f"Could not find {config_file}. Please create it first.")
+
+    config_df = pd.read_csv(config_file)
 
-try:
-    if not os.path.exists(CONFIG_FILE):
-        raise FileNotFoundError(f"Could not find {CONFIG_FILE}. Please create it first.")
-    
-    # Read CSV and convert to the exact dictionary format the engine expects
-    config_df = pd.read_csv(CONFIG_FILE)
-    
     # Verify required columns exist
     required_cols = ['Country', 'Base_FDI', 'Oil_Sensitivity', 'USD_Sensitivity', 'Stability_Vol']
     if not all(col in config_df.columns for col in required_cols):
         raise ValueError(f"CSV is missing columns. Required: {required_cols}")
 
-    # Transform to Dictionary
-    profiles = config_df.set_index('Country').to_dict('index')
-    print(f"[SUCCESS] Successfully loaded profiles for: {list(profiles.keys())}")
+    return config_df
 
-except Exception as e:
-    print(f"[CRITICAL ERROR] loading config: {e}")
-    print("Stopping execution. Please fix the CSV file.")
-    exit()
 
 # 2. FETCH REAL DRIVERS
-print("[INFO] Connecting to Yahoo Finance to fetch REAL market drivers...")
-# CL=F: Crude Oil
-# DX-Y.NYB: USD Index
-# GC=F: Gold (Critical for SA/Zim)
-# PL=F: Platinum (Critical for SA/Zim)
-tickers = ["CL=F", "DX-Y.NYB", "GC=F", "PL=F"]
+@timed("generator.fetch_drivers")
+def fetch_drivers(provider=None, start_date=START_DATE, end_date=END_DATE, cache=None):
+    """
+    Monthly Oil, USD, Gold & Platinum closes via the local driver cache.
+    Only months after the last cached one are requested from `provider` (Yahoo by default).
+    Falls back to flat dummy series if nothing is cached and the provider fails.
+    """
+    provider = provider or YahooProvider()
+    cache = cache or DriverCache()
 
-try:
-    # Download data
-    raw_data = yf.download(tickers, start=START_DATE, end=END_DATE, interval="1mo", progress=False)
-    
-    if raw_data.empty:
-        raise ValueError("Yahoo Finance returned empty data.")
-
-    # Smart Column Selection
-    if 'Adj Close' in raw_data.columns:
-        real_data = raw_data['Adj Close'].copy()
-    elif 'Close' in raw_data.columns:
-        print("[WARN] 'Adj Close' missing. Using 'Close' instead.")
-        real_data = raw_data['Close'].copy()
-    else:
-        # Fallback
-        real_data = raw_data.iloc[:, :4].copy()
-        real_data.columns = ['Oil_Price', 'USD_Index', 'Gold_Price', 'Platinum_Price']
+    try:
+        appended = cache.update(provider, TICKERS, start_date=start_date, today=end_date)
+        print(f"[INFO] Driver cache updated: {sum(appended.values())} new ticker-months.")
+    except Exception as e:
+        print(f"[ERROR] Error processing Yahoo data: {e}")
+
+    real_data = cache.frame(TICKERS)
+    if not real_data.empty:
+        return real_data
 
-except Exception as e:
-    print(f"[ERROR] Error processing Yahoo data: {e}")
     # Dummy Fallback
-    dates = pd.date_range(start=START_DATE, end=END_DATE, freq='ME')
+    dates = pd.date_range(start=start_date, end=end_date, freq='ME')
     real_data = pd.DataFrame(index=dates)
     real_data['Oil_Price'] = 70.0
     real_data['USD_Index'] = 100.0
     real_data['Gold_Price'] = 1800.0
     real_data['Platinum_Price'] = 900.0
+    return real_data
+
 
-if not real_data.empty:
+def prepare_drivers(real_data, norm_stats=None):
+    """
+    Standardizes column names, fills gaps and adds the Z-score columns used by the formulas.
+    Z-scores use the frame's own mean/std, or `norm_stats` ({col: {'n', 'mean', 'm2'}}) when given.
+    """
     # --- RENAME COLUMNS STANDARDIZATION ---
     # Ensure columns map correctly. Yahoo sorts alphabetically: CL=F, DX-Y.NYB, GC=F, PL=F
     rename_map = {
@@ -83,89 +105,327 @@ if not real_data.empty:
         'GC=F': 'Gold_Price',
         'PL=F': 'Platinum_Price'
     }
-    
+
     # If columns match tickers (usual case), rename them
-    real_data.rename(columns=rename_map, inplace=True)
-    
+    real_data = real_data.rename(columns=rename_map)
+
     # Safety Check: If renaming didn't work (unexpected format), force rename by position if 4 cols exist
     if 'Oil_Price' not in real_data.columns and real_data.shape[1] == 4:
-         real_data.columns = ['Oil_Price', 'USD_Index', 'Gold_Price', 'Platinum_Price']
+        real_data.columns = DRIVER_COLS
 
     # Fill missing data
     real_data = real_data.ffill().dropna()
 
     # --- NORMALIZE (Z-Score) ---
     # We use explicit names here so we know exactly what to call in the formula
-    for col in ['Oil_Price', 'USD_Index', 'Gold_Price', 'Platinum_Price']:
-        if col in real_data.columns:
+    for col in DRIVER_COLS:
+        if col not in real_data.columns:
+            continue
+        if norm_stats is None:
             real_data[f'{col}_Norm'] = (real_data[col] - real_data[col].mean()) / real_data[col].std()
+        else:
+            stats = norm_stats[col]
+            std = np.sqrt(stats['m2'] / (stats['n'] - 1))
+            real_data[f'{col}_Norm'] = (real_data[col] - stats['mean']) / std
+
+    return real_data
+
+
+# 3. GENERATE SEMI-SYNTHETIC DATASET
+def _name_seed(name):
+    """Stable 64-bit integer derived from a country name (independent of profile order)."""
+    return int.from_bytes(hashlib.sha256(name.encode("utf-8")).digest()[:8], "little")
+
+
+def _draw_noise(countries, n_months, seed=SEED, per_country_streams=False):
+    """
+    Standard-normal shocks shaped (countries, 4, months): GDP, inflation, interest rate, FDI.
+    Default: one legacy stream seeded once, consumed in the same order as the original
+    per-country loop, so the bundled dataset is reproduced exactly.
+    per_country_streams=True: an independent stream per country seeded by (seed, country name),
+    so adding, removing or reordering profiles never shifts another country's noise.
+    """
+    if not per_country_streams:
+        return np.random.RandomState(seed).standard_normal((len(countries), 4, n_months))
+
+    streams = [np.random.default_rng([seed, _name_seed(name)]) for name in countries]
+    return np.stack([rng.standard_normal((4, n_months)) for rng in streams])
+
+
+@timed("generator.generate_panel")
+def generate_panel(real_data, config_df, seed=SEED, per_country_streams=False, noise=None):
+    """
+    Builds the semi-synthetic panel for every profile in one broadcasted computation
+    over a (countries x months) grid. Returns the long-format frame written to CSV.
+    `noise` (countries x 4 x months standard normals) overrides the seeded draw.
+    """
+    countries = config_df['Country'].values
+    n_countries, n_months = len(countries), len(real_data)
+
+    # Profile parameters as column vectors -> broadcast against the monthly driver rows
+    base_fdi = config_df['Base_FDI'].values.astype(float)[:, None]
+    oil_sens = config_df['Oil_Sensitivity'].values.astype(float)[:, None]
+    usd_sens = config_df['USD_Sensitivity'].values.astype(float)[:, None]
+    is_mineral = np.isin(countries, MINERAL_ECONOMIES)[:, None]
+    base_inf = np.where(np.isin(countries, HIGH_INFLATION_ECONOMIES), 15.0, 6.0)[:, None]
+
+    oil_norm = real_data['Oil_Price_Norm'].values[None, :]
+    usd_norm = real_data['USD_Index_Norm'].values[None, :]
+
+    if noise is None:
+        noise = _draw_noise(countries, n_months, seed=seed, per_country_streams=per_country_streams)
+
+    # --- GDP LOGIC ---
+    # Mineral economies grow when Gold & Platinum are high; the rest follow Oil Sensitivity
+    if 'Gold_Price_Norm' in real_data.columns and 'Platinum_Price_Norm' in real_data.columns:
+        mineral_impact = (real_data['Gold_Price_Norm'].values * 0.4) + (real_data['Platinum_Price_Norm'].values * 0.4)
+        impact = np.where(is_mineral, mineral_impact[None, :], oil_norm * oil_sens)
+    else:
+        impact = oil_norm * oil_sens
+
+    gdp = 3.0 + impact + (usd_norm * usd_sens) + noise[:, 0]
+
+    # Inflation & Interest Rate
+    inflation = np.abs(base_inf - (gdp * 0.5) + noise[:, 1] * 1.5)
+    interest = inflation + 3.0 + noise[:, 2] * 0.5
+
+    # TARGET: FDI Inflows (Oil_Price_Norm doubles as global sentiment)
+    fdi = (
+        base_fdi +
+        (gdp * 20) -
+        (inflation * 5) +
+        (oil_norm * oil_sens * 50) +
+        noise[:, 3] * (base_fdi * 0.15)
+    )
+    fdi = np.maximum(fdi, 10)
+
+    # Long format: countries stacked one after another, each over the full timeline
+    panel = pd.DataFrame({
+        'Date': np.tile(real_data.index.values, n_countries),
+        'Country': np.repeat(countries, n_months),
+        'FDI_Inflows_MillionUSD': fdi.ravel(),
+        'GDP_Growth': gdp.ravel(),
+        'Inflation': inflation.ravel(),
+        'Interest_Rate': interest.ravel(),
+    })
+    for col in DRIVER_COLS:
+        if col in real_data.columns:
+            panel[col] = np.tile(real_data[col].values, n_countries)
+
+    # Only keep columns that actually exist (Safety)
+    return panel[[c for c in FINAL_COLS if c in panel.columns]]
+
+
+# 4. COLUMNAR EXPORT
+@timed("generator.write_panel")
+def write_panel(final_df, version, panel_dir=PANEL_DIR):
+    """
+    Writes the panel as one uncompressed (memory-mappable) Feather file per Country
+    into a directory named after the dataset version, then swaps the manifest to point at it.
+    Replacing the manifest is the single atomic switch: readers see either the old or
+    the new version in full, never a mix of partitions.
+    """
+    if feather is None:
+        print("[WARN] pyarrow not installed. Skipping columnar panel export (CSV only).")
+        return
+
+    version_dir = f"v_{version}"
+    os.makedirs(os.path.join(panel_dir, version_dir), exist_ok=True)
+    partitions = {}
+    for country, country_df in final_df.groupby('Country', sort=False):
+        file_name = os.path.join(version_dir, country.replace(' ', '_') + ".feather")
+        table = pa.Table.from_pandas(country_df.drop(columns='Country'), preserve_index=False)
+
+        tmp_path = os.path.join(panel_dir, file_name + ".tmp")
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, os.path.join(panel_dir, file_name))
+        partitions[country] = file_name
 
+    manifest = {'version': version, 'columns': [c for c in final_df.columns if c != 'Country'], 'partitions': partitions}
+    manifest_path = os.path.join(panel_dir, "_manifest.json")
+    previous = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            previous = f"v_{json.load(f)['version']}"
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    # Keep the new and the previous version (sessions may still be reading it); drop older ones
+    for name in os.listdir(panel_dir):
+        path = os.path.join(panel_dir, name)
+        if name.startswith("v_") and name not in (version_dir, previous):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.endswith(".feather"):
+            os.remove(path)  # Flat partitions from the pre-versioned layout
+
+
+def file_version(path):
+    """Dataset version id: leading 16 hex chars of the file's SHA-256 (same id as data_store)."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+# 5. INCREMENTAL REFRESH
+def norm_stats(real_data):
+    """Count, mean and sum of squared deviations per driver (enough to update Z-scores later)."""
+    stats = {}
+    for col in DRIVER_COLS:
+        if col in real_data.columns:
+            values = real_data[col].values.astype(float)
+            mean = values.mean()
+            stats[col] = {'n': len(values), 'mean': float(mean), 'm2': float(((values - mean) ** 2).sum())}
+    return stats
+
+
+def update_norm_stats(stats, new_drivers):
+    """Folds new rows into the running statistics (Chan et al. parallel update), without the old rows."""
+    updated = {}
+    for col, old in stats.items():
+        values = new_drivers[col].values.astype(float)
+        n_new = len(values)
+        if n_new == 0:
+            updated[col] = dict(old)
+            continue
+        mean_new = values.mean()
+        m2_new = ((values - mean_new) ** 2).sum()
+
+        n = old['n'] + n_new
+        delta = mean_new - old['mean']
+        updated[col] = {
+            'n': n,
+            'mean': float(old['mean'] + delta * n_new / n),
+            'm2': float(old['m2'] + m2_new + delta ** 2 * old['n'] * n_new / n),
+        }
+    return updated
+
+
+def _month_noise(countries, months, seed=SEED):
+    """
+    Shocks for appended rows, shaped (countries, 4, months): one stream per month seeded by (seed, month),
+    drawn as a single (countries x 4) block in profile order. A month's noise never depends on when it
+    was added (incremental runs require an unchanged profile list, so the order is fixed).
+    """
+    noise = np.empty((len(countries), 4, len(months)))
+    for j, month in enumerate(months):
+        noise[:, :, j] = np.random.default_rng([seed, month.year * 12 + month.month]).standard_normal((len(countries), 4))
+    return noise
+
+
+def extend_panel(new_drivers, config_df, stats, seed=SEED):
+    """Synthetic rows for new months only, normalized with the updated running statistics."""
+    new_drivers = prepare_drivers(new_drivers, norm_stats=stats)
+    noise = _month_noise(config_df['Country'].tolist(), new_drivers.index, seed=seed)
+    return generate_panel(new_drivers, config_df, noise=noise)
+
+
+@timed("generator.append_rows")
+def append_rows(csv_path, new_rows):
+    """
+    Inserts new rows after each country's block, copying every existing line verbatim
+    so historical rows stay byte-identical. Written to a temp file, then renamed.
+    """
+    with open(csv_path, encoding="utf-8") as f:
+        header, *lines = f.read().splitlines(keepends=True)
+
+    blocks = {}
+    for line in lines:
+        country = next(csv.reader([line]))[1]
+        blocks.setdefault(country, []).append(line)
+
+    new_text = new_rows.to_csv(index=False, header=False)
+    for line in new_text.splitlines(keepends=True):
+        country = next(csv.reader([line]))[1]
+        blocks.setdefault(country, []).append(line)
+
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        f.write(header)
+        for block in blocks.values():
+            f.writelines(block)
+    os.replace(tmp_path, csv_path)
+
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_FILE):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(full=False, provider=None):
+    print(f"[INFO] System Start. Fetching data from {START_DATE} to {END_DATE} (Today)...")
+    os.makedirs('data', exist_ok=True)
+
+    print(f"[INFO] Loading Country Profiles from {CONFIG_FILE}...")
+    try:
+        config_df = load_profiles(CONFIG_FILE)
+        print(f"[SUCCESS] Successfully loaded profiles for: {config_df['Country'].tolist()}")
+    except Exception as e:
+        print(f"[CRITICAL ERROR] loading config: {e}")
+        print("Stopping execution. Please fix the CSV file.")
+        exit()
+
+    print("[INFO] Connecting to Yahoo Finance to fetch REAL market drivers...")
+    real_data = fetch_drivers(provider=provider)
+
+    if real_data.empty:
+        print("[FAIL] Failed to download data. Check internet connection.")
+        return
+
+    real_data = prepare_drivers(real_data)
     print(f"[SUCCESS] Real Data Acquired (Oil, USD, Gold, Platinum): {real_data.shape[0]} months.")
 
-    # 3. GENERATE SEMI-SYNTHETIC DATASET
-    all_data = []
-    np.random.seed(42) 
-
-    for country, params in profiles.items():
-        # Copy the real timeline
-        df = real_data.copy().reset_index()
-        if 'Date' not in df.columns:
-            df.rename(columns={'index': 'Date'}, inplace=True)
-            
-        df['Country'] = country
-        
-        # --- GDP LOGIC (UPDATED VARIABLE NAMES) ---
-        
-        if country in ['South Africa', 'Zimbabwe']:
-             # Economy grows when Minerals are high (Gold & Platinum)
-             # Note: Using 'Gold_Price_Norm' instead of 'Gold_Norm' to match column creation above
-             impact = (df['Gold_Price_Norm'] * 0.4) + (df['Platinum_Price_Norm'] * 0.4)
-        else:
-             # Standard Model: Economy grows based on Oil Sensitivity
-             # Note: Using 'Oil_Price_Norm' instead of 'Oil_Norm'
-             impact = (df['Oil_Price_Norm'] * params['Oil_Sensitivity'])
-
-        # GDP Calculation
-        # Note: Using 'USD_Index_Norm' instead of 'USD_Norm'
-        noise_gdp = np.random.normal(0, 1, len(df))
-        df['GDP_Growth'] = 3.0 + impact + (df['USD_Index_Norm'] * params['USD_Sensitivity']) + noise_gdp
-        
-        # Inflation Calculation
-        noise_inf = np.random.normal(0, 1.5, len(df))
-        base_inf = 15.0 if country in ['Nigeria', 'Egypt'] else 6.0
-        df['Inflation'] = base_inf - (df['GDP_Growth'] * 0.5) + noise_inf
-        df['Inflation'] = df['Inflation'].abs() 
-        
-        df['Interest_Rate'] = df['Inflation'] + 3.0 + np.random.normal(0, 0.5, len(df))
-        
-        # TARGET: FDI Inflows
-        noise_fdi = np.random.normal(0, params['Base_FDI'] * 0.15, len(df))
-        
-        # We use 'Oil_Price_Norm' here for global sentiment in FDI formula
-        df['FDI_Inflows_MillionUSD'] = (
-            params['Base_FDI'] + 
-            (df['GDP_Growth'] * 20) - 
-            (df['Inflation'] * 5) + 
-            (df['Oil_Price_Norm'] * params['Oil_Sensitivity'] * 50) + 
-            noise_fdi
-        )
-        
-        df['FDI_Inflows_MillionUSD'] = df['FDI_Inflows_MillionUSD'].apply(lambda x: max(x, 10))
-        
-        # Select Columns (Include new minerals)
-        final_cols = ['Date', 'Country', 'FDI_Inflows_MillionUSD', 'GDP_Growth', 'Inflation', 'Interest_Rate', 'Oil_Price', 'USD_Index', 'Gold_Price', 'Platinum_Price']
-        
-        # Only keep columns that actually exist (Safety)
-        final_cols = [c for c in final_cols if c in df.columns]
-        
-        all_data.append(df[final_cols])
-
-    # Combine and Save
-    final_df = pd.concat(all_data)
-    final_df.to_csv("data/semi_synthetic_fdi.csv", index=False)
+    # Incremental mode: same profiles & seed as the existing dataset -> only append new months
+    state = load_state()
+    countries = config_df['Country'].tolist()
+    incremental = (
+        not full and state is not None and os.path.exists(OUTPUT_FILE)
+        and state['countries'] == countries and state['seed'] == SEED
+    )
+
+    if incremental:
+        driver_cols = [c for c in DRIVER_COLS if c in real_data.columns]
+        new_drivers = real_data.loc[real_data.index > pd.Timestamp(state['last_date']), driver_cols]
+        if new_drivers.empty:
+            print(f"[SUCCESS] Dataset already up to date ({state['last_date']}).")
+            return
+
+        stats = update_norm_stats(state['norm'], new_drivers)
+        append_rows(OUTPUT_FILE, extend_panel(new_drivers, config_df, stats))
+        write_panel(pd.read_csv(OUTPUT_FILE, parse_dates=['Date']), version=file_version(OUTPUT_FILE))
+        print(f"[SUCCESS] Appended {len(new_drivers)} new months per country.")
+    else:
+        # Full regeneration
+        stats = norm_stats(real_data)
+        final_df = generate_panel(real_data, config_df)
+        with stage("generator.write_csv"):
+            final_df.to_csv(OUTPUT_FILE + ".tmp", index=False)
+        os.replace(OUTPUT_FILE + ".tmp", OUTPUT_FILE)  # Readers never see a half-written CSV
+        write_panel(final_df, version=file_version(OUTPUT_FILE))
+
+    save_state({
+        'last_date': str(real_data.index.max().date()),
+        'seed': SEED,
+        'countries': countries,
+        'norm': stats,
+    })
 
     print("\n[SUCCESS] Dataset Generated using 'config_countries.csv'")
-    print(f"Saved to: data/semi_synthetic_fdi.csv")
+    print(f"Saved to: {OUTPUT_FILE}")
+
 
-else:
-    print("[FAIL] Failed to download data. Check internet connection.")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh market drivers and the semi-synthetic FDI panel.")
+    parser.add_argument("--full", action="store_true", help="Regenerate the whole history instead of appending new months.")
+    main(full=parser.parse_args().full)
+    print_summary()
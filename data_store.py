@@ -0,0 +1,194 @@
+import io
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+from instrumentation import timed
+
+# Optional: columnar panel reads (falls back to the CSV when pyarrow or the panel is missing)
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# --- CONFIGURATION ---
+DATA_FILE = "data/semi_synthetic_fdi.csv"
+PANEL_DIR = "data/fdi_panel"  # Written by data_generator.write_panel
+MANIFEST_FILE = "_manifest.json"
+
+# One parsed snapshot per CSV file, shared by every caller in this process.
+# Each snapshot holds one pre-sorted, Date-indexed frame per country.
+_snapshots = {}
+# Columnar backend (serves DATA_FILE only): parsed manifests and per-(partition, columns) frames,
+# keyed by file stamp. Partitions of a version the manifest no longer points at are dropped.
+_manifests = {}
+_partitions = {}
+# _lock guards the dicts above; the per-file locks serialise cold parses of one CSV only.
+_lock = threading.Lock()
+_file_locks = {}
+
+
+def _stamp(path):
+    stat = os.stat(path)  # Raises FileNotFoundError if missing
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@timed("data.parse_csv")
+def _parse(source):
+    """Parses the panel once and splits it into per-country frames."""
+    df = pd.read_csv(source, parse_dates=['Date'])
+
+    frames = {}
+    for country, country_df in df.groupby('Country', sort=False):
+        frames[country] = country_df.drop(columns='Country').sort_values('Date').set_index('Date')
+    return frames
+
+
+def _snapshot(path):
+    """
+    Returns the current snapshot for `path`, reloading only when the file changed.
+    A changed mtime triggers a content hash; the file is re-parsed only if the hash differs.
+    """
+    stamp = _stamp(path)
+
+    with _lock:
+        snap = _snapshots.get(path)
+        if snap is not None and snap['stamp'] == stamp:
+            return snap
+        file_lock = _file_locks.setdefault(path, threading.Lock())
+
+    # One thread parses; readers of other files (and of the cached snapshots) are not blocked
+    with file_lock:
+        with _lock:
+            snap = _snapshots.get(path)
+            if snap is not None and snap['stamp'] == stamp:
+                return snap  # Loaded by another thread while this one waited
+
+        # Hash and parse the same bytes, so a file swapped mid-read can't pair one version's id with another's data
+        with open(path, "rb") as f:
+            content = f.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        if snap is not None and snap['hash'] == content_hash:
+            # File was touched/rewritten with identical content: keep the parsed frames
+            snap = dict(snap, stamp=stamp)
+        else:
+            snap = {'stamp': stamp, 'hash': content_hash, 'frames': _parse(io.BytesIO(content))}
+        with _lock:
+            _snapshots[path] = snap
+        return snap
+
+
+def _manifest(data_file, panel_dir):
+    """
+    The columnar panel manifest, or None when the panel (or pyarrow) is unavailable.
+    The panel is a copy of DATA_FILE, so any other `data_file` is always read from its CSV.
+    """
+    if feather is None or data_file != DATA_FILE:
+        return None
+    path = os.path.join(panel_dir, MANIFEST_FILE)
+    try:
+        stamp = _stamp(path)
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        cached = _manifests.get(path)
+        if cached is not None and cached['stamp'] == stamp:
+            return cached['manifest']
+
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    with _lock:
+        _manifests[path] = {'stamp': stamp, 'manifest': manifest}
+        _drop_partitions(panel_dir, keep_version=manifest['version'])
+    return manifest
+
+
+def _drop_partitions(panel_dir, keep_version=None):
+    """Forgets cached partitions of `panel_dir` (except those of `keep_version`). Caller holds _lock."""
+    for key in [k for k, e in _partitions.items() if e['panel_dir'] == panel_dir and e['version'] != keep_version]:
+        del _partitions[key]
+
+
+@timed("data.read_partition")
+def _read_partition(panel_dir, manifest, country_name, columns):
+    """Reads one country's partition, memory-mapped, restricted to `columns`."""
+    file_name = manifest['partitions'].get(country_name)
+    if file_name is None:
+        return pd.DataFrame()
+
+    path = os.path.join(panel_dir, file_name)
+    wanted = manifest['columns'] if columns is None else ['Date'] + [c for c in columns if c in manifest['columns'] and c != 'Date']
+    key = (path, tuple(wanted))
+    stamp = _stamp(path)
+
+    with _lock:
+        cached = _partitions.get(key)
+        if cached is not None and cached['stamp'] == stamp:
+            return cached['frame']
+
+    table = feather.read_table(path, columns=wanted, memory_map=True)
+    frame = table.to_pandas().sort_values('Date').set_index('Date')
+
+    with _lock:
+        current = _manifests.get(os.path.join(panel_dir, MANIFEST_FILE))
+        if current is not None and current['manifest']['version'] == manifest['version']:
+            # Not cached if the manifest moved on while reading (the entry would never be evicted)
+            _partitions[key] = {'stamp': stamp, 'frame': frame, 'panel_dir': panel_dir, 'version': manifest['version']}
+    return frame
+
+
+def get_country_snapshot(country_name, path=DATA_FILE, columns=None, panel_dir=PANEL_DIR):
+    """
+    Returns (frame, version): one country's Date-indexed frame (empty if unknown) and the
+    dataset version it was read from, taken from the same manifest/snapshot so the pair
+    stays consistent even if a refresh swaps the dataset concurrently.
+    Reads only that country's columnar partition when the panel exists (default `path` only), else the CSV snapshot.
+    `columns` limits what is read from the panel (the CSV path returns every column).
+    The frame is shared, not copied: callers must treat it as read-only.
+    """
+    manifest = _manifest(path, panel_dir)
+    if manifest is not None:
+        return _read_partition(panel_dir, manifest, country_name, columns), manifest['version']
+
+    snap = _snapshot(path)
+    return snap['frames'].get(country_name, pd.DataFrame()), snap['hash'][:16]
+
+
+def get_country_frame(country_name, path=DATA_FILE, columns=None, panel_dir=PANEL_DIR):
+    """Returns the Date-indexed frame for one country (see get_country_snapshot)."""
+    return get_country_snapshot(country_name, path=path, columns=columns, panel_dir=panel_dir)[0]
+
+
+def list_countries(path=DATA_FILE, panel_dir=PANEL_DIR):
+    """Countries present in the current dataset snapshot."""
+    manifest = _manifest(path, panel_dir)
+    if manifest is not None:
+        return list(manifest['partitions'].keys())
+    return list(_snapshot(path)['frames'].keys())
+
+
+def dataset_version(path=DATA_FILE, panel_dir=PANEL_DIR):
+    """Content hash identifying the dataset snapshot currently served."""
+    manifest = _manifest(path, panel_dir)
+    if manifest is not None:
+        return manifest['version']
+    return _snapshot(path)['hash'][:16]
+
+
+def clear(path=None, panel_dir=PANEL_DIR):
+    """
+    Drops cached snapshots: all of them, or just those serving `path`
+    (for DATA_FILE that includes the manifest and partitions of `panel_dir`).
+    """
+    with _lock:
+        if path is None:
+            _snapshots.clear()
+            _manifests.clear()
+            _partitions.clear()
+            return
+        _snapshots.pop(path, None)
+        if path == DATA_FILE:
+            _manifests.pop(os.path.join(panel_dir, MANIFEST_FILE), None)
+            _drop_partitions(panel_dir)
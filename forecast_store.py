@@ -0,0 +1,200 @@
+import io
+import os
+import sqlite3
+import datetime
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from model_engine import load_training_frame, fitted_model, assemble_forecast, assemble_intervals, CONFIG_FILE
+import data_store
+
+# Optional: frames are stored as Parquet bytes (without pyarrow the store is skipped and the app computes live)
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# --- CONFIGURATION ---
+STORE_FILE = "cache/forecasts.sqlite"
+HORIZONS = range(12, 61)        # Every horizon the dashboard slider can ask for
+BAND_QUANTILES = (0.05, 0.95)   # Dashboard confidence band
+BAND_SEED = 42                  # Same seed as the dashboard, so stored and live bands are identical
+KEEP_VERSIONS = 2               # Dataset versions kept in the store (current + previous)
+STORE_FORMAT = 2                # PRAGMA user_version; stores written in another format are rebuilt
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    version    TEXT NOT NULL,
+    country    TEXT NOT NULL,
+    horizon    INTEGER NOT NULL,
+    signal     TEXT NOT NULL,
+    frame      BLOB NOT NULL,   -- Parquet train_and_forecast DataFrame (History + Forecast rows)
+    bands      BLOB,            -- Parquet forecast_intervals DataFrame (NULL if not materialized)
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (version, country, horizon)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS versions (
+    version    TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+def _encode(df):
+    """DataFrame as Parquet bytes: plain data, nothing executable on read (labels stored as text)."""
+    buffer = io.BytesIO()
+    df.rename(columns=str).to_parquet(buffer)
+    return buffer.getvalue()
+
+
+def _decode(blob, float_columns=False):
+    df = pd.read_parquet(io.BytesIO(blob))
+    if float_columns:
+        df.columns = [float(c) for c in df.columns]  # Band quantiles
+    return df
+
+
+def _connect(path=STORE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")  # Dashboard reads never wait for a materialization write
+    if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_FORMAT:
+        # Older stores held pickled frames: drop them rather than ever unpickling
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS forecasts")
+            conn.execute("DROP TABLE IF EXISTS versions")
+        conn.execute(f"PRAGMA user_version = {STORE_FORMAT}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _lookup(column, country, horizon, version, path):
+    if pyarrow is None or not os.path.exists(path):
+        return None
+    try:
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != STORE_FORMAT:
+                return None  # Not materialized in this format yet
+            row = conn.execute(
+                f"SELECT signal, {column} FROM forecasts WHERE version = ? AND country = ? AND horizon = ?",
+                (version, country, int(horizon)),
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"[WARN] Forecast store unavailable: {e}")
+        return None
+    return row
+
+
+def get_forecast(country, horizon, version=None, path=STORE_FILE):
+    """
+    Precomputed (final_df, signal) for one market/horizon/dataset version, or None on a miss.
+    One primary-key lookup; callers fall back to train_and_forecast when this returns None.
+    """
+    version = version or data_store.dataset_version()
+    row = _lookup("frame", country, horizon, version, path)
+    if row is None:
+        return None
+    return _decode(row[1]), row[0]
+
+
+def get_bands(country, horizon, version=None, path=STORE_FILE):
+    """Precomputed dashboard confidence band (see BAND_QUANTILES), or None on a miss."""
+    version = version or data_store.dataset_version()
+    row = _lookup("bands", country, horizon, version, path)
+    if row is None or row[1] is None:
+        return None
+    return _decode(row[1], float_columns=True)
+
+
+# --- MATERIALIZATION ---
+def _materialize_worker(args):
+    """
+    Every horizon for one country, from one read of its data. Returns (country, version, rows) with
+    the version of the snapshot actually fitted, so rows are never filed under a version swapped in meanwhile.
+    """
+    country, horizons, with_bands = args
+    train_df, error = load_training_frame(country)
+    if error:
+        print(f"[WARN] {country}: {error}")
+        return country, None, []
+
+    var_result = fitted_model(country, train_df)  # Shared by every horizon
+    rows = []
+    for horizon in horizons:
+        forecast = var_result.forecast(y=train_df.values[-var_result.k_ar:], steps=horizon)
+        final_df, signal = assemble_forecast(train_df, forecast)
+        bands = None
+        if with_bands:
+            bands = _encode(assemble_intervals(train_df, var_result, horizon, quantiles=BAND_QUANTILES, seed=BAND_SEED))
+        rows.append((horizon, signal, _encode(final_df), bands))
+    return country, train_df.attrs['dataset_version'], rows
+
+
+def materialize(countries=None, horizons=HORIZONS, with_bands=True, max_workers=None, path=STORE_FILE):
+    """
+    Computes every (country, horizon) forecast + signal (and band) for the current dataset version
+    and writes them to the store, one worker process per country. Rows already stored for this
+    version are skipped, so re-running after an unchanged refresh is cheap.
+    Returns the number of rows written.
+    """
+    if pyarrow is None:
+        print("[WARN] pyarrow not installed. Skipping the forecast store (the dashboard computes live).")
+        return 0
+    if countries is None:
+        countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+    version = data_store.dataset_version()
+    now = datetime.datetime.now().isoformat(timespec='seconds')
+
+    conn = _connect(path)
+    try:
+        done = set(conn.execute("SELECT country, horizon FROM forecasts WHERE version = ?", (version,)))
+        jobs = []
+        for country in countries:
+            missing = [h for h in horizons if (country, h) not in done]
+            if missing:
+                jobs.append((country, missing, with_bands))
+        if not jobs:
+            print(f"[INFO] Forecast store already complete for version {version}.")
+            return 0
+
+        written, stored_versions = 0, {version}
+        max_workers = min(max_workers or os.cpu_count() or 1, len(jobs)) or 1
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for country, fitted_version, rows in pool.map(_materialize_worker, jobs):
+                if not rows:
+                    continue
+                if fitted_version != version:
+                    print(f"[WARN] {country}: dataset changed to version {fitted_version} during the run.")
+                with conn:  # One transaction per country
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(fitted_version, country, h, signal, frame, bands, now) for h, signal, frame, bands in rows],
+                    )
+                stored_versions.add(fitted_version)
+                written += len(rows)
+                print(f"[INFO] Stored {len(rows)} horizons for {country}.")
+
+        # Keep the newest versions only (a session may still be serving the previous one)
+        with conn:
+            for stored in sorted(stored_versions, key=lambda v: v != version):
+                conn.execute("INSERT OR IGNORE INTO versions VALUES (?, ?)", (stored, now))
+            stale = [v for (v,) in conn.execute("SELECT version FROM versions ORDER BY created_at DESC, rowid DESC")][KEEP_VERSIONS:]
+            for old in stale:
+                conn.execute("DELETE FROM forecasts WHERE version = ?", (old,))
+                conn.execute("DELETE FROM versions WHERE version = ?", (old,))
+        return written
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute dashboard forecasts for the current dataset version.")
+    parser.add_argument("--no-bands", action="store_true", help="Skip the simulated confidence bands.")
+    args = parser.parse_args()
+
+    print("[INFO] Materializing forecasts...")
+    written = materialize(with_bands=not args.no_bands)
+    print(f"[SUCCESS] Forecast store updated: {written} rows written to {STORE_FILE}")
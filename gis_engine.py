@@ -1,129 +1,725 @@
-import folium
-from folium.plugins import HeatMap
-import webbrowser
 import os
-from geopy.distance import geodesic
+import json
+import hashlib
+import functools
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import ndimage, sparse
+from sklearn.neighbors import BallTree
+import city_profiles
+from instrumentation import stage, timed, print_summary
 
-# --- CONFIGURATION: HARARE WAR ROOM ---
-CITY_CENTER = [-17.795, 31.08]
-ZOOM_START = 11
+# Optional: pre-rendered heatmap tiles for the lightweight map
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# --- CONFIGURATION: DEFAULT CITY (HARARE WAR ROOM) ---
+# Spatial inputs are read from data/cities (see city_profiles.py); these names hold the default city
+_default_city = city_profiles.load_city(city_profiles.DEFAULT_CITY)
+CITY_CENTER = _default_city['center']
+ZOOM_START = _default_city['zoom']
+CITY_BBOX = _default_city['bbox']  # (lat_min, lon_min, lat_max, lon_max)
+
+# --- SPATIAL ENGINE SETTINGS ---
+EARTH_RADIUS_KM = 6371.0088   # Mean Earth radius (haversine distances)
+VIABILITY_RADIUS_KM = 3.0     # A site is a gap if the nearest mall is further than this
+EXACT_DISTANCE = True         # Re-check shortlisted sites with exact WGS-84 geodesic distance
+EXACT_CANDIDATES = 3          # Nearest malls (by haversine) re-measured geodesically per shortlisted site
+HAVERSINE_TOLERANCE = 0.005   # Haversine is within ~0.5% of geodesic: borderline sites are shortlisted too
+
+# --- GRID SCAN SETTINGS ---
+SCAN_RESOLUTION_M = 250       # Cell size; 50m over the full bbox is ~1M cells
+DEMAND_BANDWIDTH_KM = 2.0     # Gaussian kernel bandwidth for demand density
+DEMAND_THRESHOLD = 0.3        # Minimum kernel density for a cell to count as a high-density zone
+SCAN_CHUNK_CELLS = 250_000    # Cells per worker task (bounds per-task memory)
+
+# --- DEMAND RASTER SETTINGS ---
+RASTER_DIR = "cache/gis"      # Demand rasters: <key>.npy (values) + <key>.json (georeferencing)
+RASTER_RESOLUTION_M = 100     # Cell size of the raster used for site lookups
+
+# --- GRAVITY (HUFF) MODEL SETTINGS ---
+HUFF_BETA = 2.0               # Distance decay: a store's pull on a cell is attractiveness * distance^-beta
+HUFF_CUTOFF_KM = 8.0          # Cells further than this from a store get no pull from it (sparse matrix cutoff)
+HUFF_MIN_DISTANCE_KM = 0.25   # Distance floor, so a store sitting on a cell centre has a finite pull
+HUFF_DEMAND_FLOOR = 0.01      # Raster cells below this demand are left out of the model
+HUFF_CHUNK_STORES = 64        # Stores per sparse block (bounds memory whatever the store count)
+HUFF_ATTRACTIVENESS = 'attractiveness'  # Optional POI property (default 1.0), e.g. relative floor area
+
+# --- MAP OUTPUT SETTINGS ---
+MAP_FILE = "{city}_gap_hunter.html"  # Per city, e.g. harare_gap_hunter.html
+LIGHT_MAP_MIN_POIS = 500      # From this many points, generate_map switches to the lightweight output
+HEAT_TILE_ZOOMS = range(10, 14)  # Zoom levels pre-rendered as heatmap tiles (deeper zooms upscale z13)
+HEAT_GRADIENT = {0.4: 'blue', 0.65: 'lime', 1: 'red'}
+HEAT_MAX_POINTS = 300         # Heat samples inlined into the standard map (larger density files use raster samples)
 
 # --- 1. THE SUPPLY (Verified Assets & Competitors) ---
-terrace_assets = [
-    # 1. THE NORTHERN CLUSTER (Premium)
-    {
-        "name": "Borrowdale Village Walk", 
-        "loc": [-17.761731382494474, 31.0869205512889], 
-        "status": "Operational (Anchor: Pick n Pay)"
-    },
-    {
-        "name": "Highland Park (Ph1 & Ph2)", 
-        "loc": [-17.79684412486667, 31.099360549725017], 
-        "status": "Operational (Anchor: Pick n Pay)"
-    },
-    {
-        "name": "Cardinal's Corner", 
-        "loc": [-17.77865594513171, 31.12673240285413], 
-        "status": "Development (Anchor: Spar)"
-    },
-    
-    # 2. THE AVENUES / CBD CLUSTER
-    {
-        "name": "Chinamano Corner", 
-        "loc": [-17.81768105658674, 31.047830339643234], 
-        "status": "Operational (Anchor: Puma)"
-    },
-
-    # 3. THE WESTERN CLUSTER
-    {
-        "name": "Greenfields Retail Centre", 
-        "loc": [-17.829955899263425, 31.02520161080814], 
-        "status": "Operational (Belvedere)"
-    }
-]
-
-competitors = [
-    {"name": "Sam Levy's Village", "loc": [-17.75947146725432, 31.089577529841723]},
-    {"name": "Avondale Shopping Centre", "loc": [-17.80244358127244, 31.03841003353702]},
-    {"name": "Westgate Shopping Mall", "loc": [-17.763000088225223, 30.978995487512506]},
-    {"name": "Arundel Village", "loc": [-17.76306483626415, 31.0508650642185]},
-    {"name": "Greendale Shopping Centre", "loc": [-17.81903580403664, 31.12130568352962]},
-    {"name": "Chisipite Shopping Centre", "loc": [-17.78309145353249, 31.119837242771922]},
-    {"name": "Madokero Mall", "loc": [-17.79325310198947, 30.95903144092514]}
-]
+terrace_assets = _default_city['terrace_assets']
+competitors = _default_city['competitors']
 
 # --- 2. THE DEMAND (Residential Heatmap Data) ---
-# Simulating "Roof Counts" in high-growth zones
-residential_density = [
-    [-17.7200, 31.1300, 1.0], # Borrowdale Brooke (High Income)
-    [-17.7800, 31.0500, 0.8], # Mt Pleasant / Vainona
-    [-17.8800, 31.2400, 0.9], # Ruwa / Zimre (Massive Growth Node)
-    [-17.7800, 30.9500, 0.9], # Madokero / Westgate Area (Expansion)
-    [-17.8300, 31.1000, 0.7], # Greendale / Msasa
-    [-18.006715106442986, 31.080902528010935, 0.8], # Chitungwiza (High Density)
-]
+# [lat, lon, weight] "Roof Counts" in high-growth zones
+residential_density = _default_city['residential_density']
 
 # --- 3. THE GAP HUNTER (Potential Sites to Test) ---
-potential_sites = [
-    {"name": "Opportunity A: Ruwa Growth Point", "loc": [-17.885, 31.245]},
-    {"name": "Opportunity B: Madokero Estate", "loc": [-17.785, 30.955]},
-    {"name": "Opportunity C: Pomona City", "loc": [-17.730, 31.080]}
-]
+potential_sites = _default_city['potential_sites']
+
+class MallIndex:
+    """
+    BallTree over mall coordinates (haversine metric), built once per mall set.
+    Answers batched nearest-neighbour and radius queries for arrays of [lat, lon] sites.
+    """
+
+    def __init__(self, malls):
+        self.malls = list(malls)
+        self.coords = np.array([m['loc'] for m in self.malls], dtype=float)
+        self.tree = BallTree(np.radians(self.coords), metric='haversine')
+
+    def nearest(self, site_locs, k=1):
+        """Returns (distances_km, mall_indices), each shaped (n_sites, k), nearest first."""
+        sites = np.radians(np.atleast_2d(np.asarray(site_locs, dtype=float)))
+        dist, idx = self.tree.query(sites, k=min(k, len(self.malls)))
+        return dist * EARTH_RADIUS_KM, idx
+
+    def within(self, site_locs, radius_km):
+        """Returns (mall_indices, distances_km) per site: every mall within `radius_km`, nearest first."""
+        sites = np.radians(np.atleast_2d(np.asarray(site_locs, dtype=float)))
+        idx, dist = self.tree.query_radius(sites, r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True)
+        return idx, [d * EARTH_RADIUS_KM for d in dist]
+
+
+_mall_indexes = {}
+
+def get_mall_index(malls=None):
+    """Cached MallIndex for a mall list (default: terrace_assets + competitors); rebuilt only if the coordinates change."""
+    malls = terrace_assets + competitors if malls is None else malls
+    key = tuple(tuple(m['loc']) for m in malls)
+    if key not in _mall_indexes:
+        _mall_indexes[key] = MallIndex(malls)
+    return _mall_indexes[key]
+
+
+@timed("gis.check_viability")
+def check_viability_batch(site_locs, malls=None, exact=EXACT_DISTANCE, demand=True, raster=None):
+    """
+    Distance to the nearest mall for many sites at once, plus the viability flag:
+    nearest mall > 3km AND (with `demand`) the site lies in a high-density zone of the demand raster.
+    Haversine via the spatial index for every site; with `exact`, only the shortlisted sites
+    (viable or borderline) are re-measured with geodesic distance to their nearest candidates.
+    `raster` is the city's DemandRaster (default: the default city's).
+    Returns (distances_km, is_viable) arrays.
+    """
+    index = get_mall_index(malls)
+    sites = np.atleast_2d(np.asarray(site_locs, dtype=float))
+    dist, idx = index.nearest(sites, k=EXACT_CANDIDATES if exact else 1)
+    min_dist = dist[:, 0].copy()
+
+    if exact:
+        from geopy.distance import geodesic  # Deferred: only the exact re-check needs geopy
+        shortlist = np.flatnonzero(min_dist > VIABILITY_RADIUS_KM * (1 - HAVERSINE_TOLERANCE))
+        with stage("gis.geodesic_refine"):
+            for i in shortlist:
+                min_dist[i] = min(geodesic(sites[i], index.coords[j]).km for j in idx[i])
+
+    viable = min_dist > VIABILITY_RADIUS_KM
+    if demand:
+        viable &= in_high_density_zone(sites, raster=raster)
+    return min_dist, viable
+
+
+def in_high_density_zone(site_locs, threshold=DEMAND_THRESHOLD, raster=None):
+    """In_High_Density_Zone flag per site: an O(1) cell lookup in the cached demand raster."""
+    raster = get_demand_raster() if raster is None else raster
+    return raster.lookup(site_locs) >= threshold
+
 
 def check_viability(site_loc):
-    """Returns distance to nearest mall & True if > 3km gap."""
-    all_malls = terrace_assets + competitors
-    min_dist = float('inf')
-    
-    for mall in all_malls:
-        dist = geodesic(site_loc, mall['loc']).km
-        if dist < min_dist:
-            min_dist = dist
-            
-    return min_dist, min_dist > 3.0  # Viable if > 3km gap
-
-def generate_map():
-    m = folium.Map(location=CITY_CENTER, zoom_start=ZOOM_START, tiles="CartoDB dark_matter")
-
-    # A. Draw Heatmap (Where the people live)
-    HeatMap(residential_density, radius=25, blur=15, 
-            gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}).add_to(m)
+    """Returns distance to nearest mall & True if > 3km gap in a high-density zone."""
+    dist, viable = check_viability_batch([site_loc])
+    return float(dist[0]), bool(viable[0])
+
+def _grid_steps(bbox, resolution_m):
+    """Cell size in degrees (lat_step, lon_step) for ~resolution_m cells at the bbox's mid-latitude."""
+    lat_min, _, lat_max, _ = bbox
+    lat_step = resolution_m / 111_320.0
+    return lat_step, lat_step / np.cos(np.radians((lat_min + lat_max) / 2))
+
+
+def _grid_axes(bbox, resolution_m):
+    """Cell-centre latitudes (north to south) and longitudes for a bbox at ~resolution_m spacing."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    lat_step, lon_step = _grid_steps(bbox, resolution_m)
+    lats = np.arange(lat_max - lat_step / 2, lat_min, -lat_step)
+    lons = np.arange(lon_min + lon_step / 2, lon_max, lon_step)
+    return lats, lons
+
+
+class DemandRaster:
+    """
+    Demand density on a regular lat/lon grid (row 0 = north edge, column 0 = west edge).
+    Values may be a read-only memory map of the cached .npy file.
+    """
+
+    def __init__(self, values, meta):
+        self.values = values
+        self.meta = meta
+        self.lat_max, self.lon_min = meta['lat_max'], meta['lon_min']
+        self.lat_step, self.lon_step = meta['lat_step'], meta['lon_step']
+
+    def cell(self, site_locs):
+        """(row, col) arrays for [lat, lon] sites; -1 where the site falls outside the raster."""
+        sites = np.atleast_2d(np.asarray(site_locs, dtype=float))
+        rows = np.floor((self.lat_max - sites[:, 0]) / self.lat_step).astype(np.int64)
+        cols = np.floor((sites[:, 1] - self.lon_min) / self.lon_step).astype(np.int64)
+        outside = (rows < 0) | (rows >= self.values.shape[0]) | (cols < 0) | (cols >= self.values.shape[1])
+        rows[outside], cols[outside] = -1, -1
+        return rows, cols
+
+    def lookup(self, site_locs):
+        """Demand at each site: one array index per site (0 outside the raster)."""
+        rows, cols = self.cell(site_locs)
+        inside = rows >= 0
+        demand = np.zeros(len(rows))
+        demand[inside] = self.values[rows[inside], cols[inside]]
+        return demand
+
+    def heat_points(self, max_points=HEAT_MAX_POINTS, floor=0.05):
+        """[lat, lon, demand] samples of the raster for a point heatmap layer (strided to ~max_points cells)."""
+        stride = max(1, int(np.ceil(np.sqrt(self.values.size / max_points))))
+        lats, lons = self.cell_centres()
+        sample = np.asarray(self.values[::stride, ::stride], dtype=float)
+        rows, cols = np.nonzero(sample >= floor)
+        return np.column_stack([lats[::stride][rows], lons[::stride][cols], sample[rows, cols]]).tolist()
+
+    def cell_centres(self):
+        """Latitude (north to south) and longitude of every row / column centre."""
+        lats = self.lat_max - (np.arange(self.values.shape[0]) + 0.5) * self.lat_step
+        lons = self.lon_min + (np.arange(self.values.shape[1]) + 0.5) * self.lon_step
+        return lats, lons
+
+
+@timed("gis.rasterize")
+def rasterize_demand(points, bbox=CITY_BBOX, resolution_m=RASTER_RESOLUTION_M, bandwidth_km=DEMAND_BANDWIDTH_KM):
+    """
+    Weighted kernel density of [lat, lon, weight] points on the city grid.
+    Points are binned with one weighted 2D histogram, then smoothed with a separable Gaussian filter,
+    so the cost depends on the grid size, not on the number of points (footprints, roof counts...).
+    The kernel is unnormalised: an isolated point of weight w gives a peak of ~w, as DEMAND_THRESHOLD expects.
+    Returns (values float32 array, georeferencing dict).
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    lats, lons = _grid_axes(bbox, resolution_m)
+    lat_step, lon_step = _grid_steps(bbox, resolution_m)
+    lat_max, lon_min = bbox[2], bbox[1]
+
+    # 1. Bin weights into cells (histogram2d needs increasing edges: bin by south-to-north, then flip)
+    lat_edges = lat_max - np.arange(len(lats) + 1)[::-1] * lat_step
+    lon_edges = lon_min + np.arange(len(lons) + 1) * lon_step
+    counts, _, _ = np.histogram2d(points[:, 0], points[:, 1], bins=[lat_edges, lon_edges], weights=points[:, 2])
+    counts = counts[::-1]
+
+    # 2. Gaussian smoothing (cells are ~square in metres, so one sigma serves both axes)
+    sigma = bandwidth_km * 1000.0 / resolution_m
+    values = ndimage.gaussian_filter(counts, sigma=sigma, mode='constant') * (2 * np.pi * sigma ** 2)
+
+    meta = {
+        'bbox': list(bbox), 'resolution_m': resolution_m, 'bandwidth_km': bandwidth_km,
+        'lat_max': float(lat_max), 'lon_min': float(lon_min),
+        'lat_step': float(lat_step), 'lon_step': float(lon_step),
+        'shape': list(values.shape), 'n_points': int(len(points)),
+    }
+    return values.astype(np.float32), meta
+
+
+def _raster_key(points, bbox, resolution_m, bandwidth_km):
+    h = hashlib.sha1(np.ascontiguousarray(np.asarray(points, dtype=float)).tobytes())
+    h.update(repr((tuple(bbox), float(resolution_m), float(bandwidth_km))).encode())
+    return h.hexdigest()[:16]
+
+
+_demand_rasters = {}
+
+def get_demand_raster(points=None, bbox=CITY_BBOX, resolution_m=RASTER_RESOLUTION_M,
+                      bandwidth_km=DEMAND_BANDWIDTH_KM, raster_dir=RASTER_DIR):
+    """
+    Cached DemandRaster for a point set (default: residential_density).
+    Built once per (points, bbox, resolution, bandwidth) and saved to `raster_dir`;
+    later calls (and later processes) memory-map the .npy instead of recomputing density.
+    """
+    points = np.asarray(residential_density if points is None else points, dtype=float).reshape(-1, 3)
+    key = _raster_key(points, bbox, resolution_m, bandwidth_km)
+    if key in _demand_rasters:
+        return _demand_rasters[key]
+
+    values_path = os.path.join(raster_dir, f"demand_{key}.npy")
+    meta_path = os.path.join(raster_dir, f"demand_{key}.json")
+    if os.path.exists(values_path) and os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        values = np.load(values_path, mmap_mode='r')
+    else:
+        values, meta = rasterize_demand(points, bbox, resolution_m, bandwidth_km)
+        try:
+            # Atomic publish: values first, metadata last (readers require both)
+            os.makedirs(raster_dir, exist_ok=True)
+            with open(values_path + ".tmp", "wb") as f:
+                np.save(f, values)
+            os.replace(values_path + ".tmp", values_path)
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError as e:
+            print(f"[WARN] Could not cache demand raster: {e}")
+
+    _demand_rasters[key] = DemandRaster(values, meta)
+    return _demand_rasters[key]
+
+
+class HuffModel:
+    """
+    Huff gravity model: each demand cell splits its demand between the stores in reach
+    in proportion to attractiveness * distance^-HUFF_BETA (stores beyond HUFF_CUTOFF_KM get nothing).
+    Cell x store utilities are built as sparse blocks of at most HUFF_CHUNK_STORES stores from
+    BallTree radius queries, and only the per-cell denominators (total pull of the current stores)
+    are kept, so memory stays O(cells) whatever the store count. Adding or removing one store
+    updates the denominators of the cells within its cutoff only.
+    """
+
+    def __init__(self, cell_locs, demand, stores=(), beta=HUFF_BETA, cutoff_km=HUFF_CUTOFF_KM):
+        self.cell_locs = np.asarray(cell_locs, dtype=float).reshape(-1, 2)
+        self.demand = np.asarray(demand, dtype=float)
+        self.beta, self.cutoff_km = beta, cutoff_km
+        # No cell above the demand floor (empty or very sparse density file): every score is zero
+        self.tree = BallTree(np.radians(self.cell_locs), metric='haversine') if len(self.demand) else None
+        self.stores = []
+        self.denominator = np.zeros(len(self.demand))
+        self.add_stores(stores)
+
+    @classmethod
+    def from_raster(cls, raster, stores=(), floor=HUFF_DEMAND_FLOOR, **kwargs):
+        """Model over the centres of every raster cell with demand >= floor."""
+        lats, lons = raster.cell_centres()
+        values = np.asarray(raster.values, dtype=float)
+        rows, cols = np.nonzero(values >= floor)
+        return cls(np.column_stack([lats[rows], lons[cols]]), values[rows, cols], stores, **kwargs)
+
+    def utilities(self, locs, attractiveness=1.0):
+        """Sparse (cells x len(locs)) CSC matrix of attractiveness * distance^-beta within the cutoff."""
+        locs = np.atleast_2d(np.asarray(locs, dtype=float))
+        if self.tree is None:
+            return sparse.csc_matrix((0, len(locs)))
+        idx, dist = self.tree.query_radius(np.radians(locs), r=self.cutoff_km / EARTH_RADIUS_KM, return_distance=True)
+        counts = np.array([len(i) for i in idx], dtype=np.int64)
+        rows = np.concatenate(idx).astype(np.int64) if counts.sum() else np.empty(0, dtype=np.int64)
+        dist_km = np.concatenate(dist) * EARTH_RADIUS_KM if counts.sum() else np.empty(0)
+
+        attractiveness = np.broadcast_to(np.asarray(attractiveness, dtype=float), (len(locs),))
+        values = np.repeat(attractiveness, counts) * np.maximum(dist_km, HUFF_MIN_DISTANCE_KM) ** -self.beta
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return sparse.csc_matrix((values, rows, indptr), shape=(len(self.demand), len(locs)))
+
+    def _blocks(self, stores):
+        """(offset, utilities) for consecutive chunks of stores."""
+        for first in range(0, len(stores), HUFF_CHUNK_STORES):
+            chunk = stores[first:first + HUFF_CHUNK_STORES]
+            yield first, self.utilities([s['loc'] for s in chunk], [s.get(HUFF_ATTRACTIVENESS, 1.0) for s in chunk])
+
+    def add_stores(self, stores):
+        stores = list(stores)
+        for _, block in self._blocks(stores):
+            np.add.at(self.denominator, block.indices, block.data)
+        self.stores.extend(stores)
+
+    def add_store(self, store):
+        """Adds one store ({'name', 'loc'[, 'attractiveness']}); touches only the cells within its cutoff."""
+        self.add_stores([store])
+
+    def remove_store(self, name):
+        """Removes the first store called `name` by subtracting its own utilities. Returns the store."""
+        position = next((i for i, s in enumerate(self.stores) if s['name'] == name), None)
+        if position is None:
+            raise KeyError(f"No store named '{name}' in the model.")
+        store = self.stores.pop(position)
+        column = self.utilities([store['loc']], store.get(HUFF_ATTRACTIVENESS, 1.0))
+        rows = column.indices
+        self.denominator[rows] = np.maximum(self.denominator[rows] - column.data, 0.0)
+        return store
+
+    def score_sites(self, site_locs, attractiveness=1.0):
+        """
+        Huff score of candidate sites against the current stores (each site scored on its own).
+        Returns (captured, share): the demand the site would capture and its share of the demand in its reach.
+        """
+        sites = np.atleast_2d(np.asarray(site_locs, dtype=float))
+        attractiveness = np.broadcast_to(np.asarray(attractiveness, dtype=float), (len(sites),))
+        captured, reachable = np.zeros(len(sites)), np.zeros(len(sites))
+        for first in range(0, len(sites), HUFF_CHUNK_STORES):
+            block = self.utilities(sites[first:first + HUFF_CHUNK_STORES], attractiveness[first:first + HUFF_CHUNK_STORES])
+            n = block.shape[1]
+            column = np.repeat(np.arange(n), np.diff(block.indptr))
+            demand = self.demand[block.indices]
+            probability = block.data / (self.denominator[block.indices] + block.data)
+            captured[first:first + n] = np.bincount(column, weights=demand * probability, minlength=n)
+            reachable[first:first + n] = np.bincount(column, weights=demand, minlength=n)
+        share = np.divide(captured, reachable, out=np.zeros_like(captured), where=reachable > 0)
+        return captured, share
+
+    def store_capture(self):
+        """Demand captured by each current store (same order as self.stores)."""
+        ratio = np.divide(self.demand, self.denominator, out=np.zeros_like(self.demand), where=self.denominator > 0)
+        captured = np.empty(len(self.stores))
+        for first, block in self._blocks(self.stores):
+            captured[first:first + block.shape[1]] = block.T @ ratio
+        return captured
+
+
+def _scan_rows(args):
+    """Worker: nearest-mall distance for a band of grid rows (float32 to halve memory)."""
+    lats, lons, mall_coords = args
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+    tree = BallTree(np.radians(mall_coords), metric='haversine')
+    dist = tree.query(np.radians(np.column_stack([lat_grid.ravel(), lon_grid.ravel()])), k=1)[0][:, 0]
+    return (dist * EARTH_RADIUS_KM).reshape(lat_grid.shape).astype(np.float32)
+
+
+@timed("gis.scan")
+def scan_city_grid(bbox=CITY_BBOX, resolution_m=SCAN_RESOLUTION_M, malls=None, points=None,
+                   min_gap_km=VIABILITY_RADIUS_KM, demand_threshold=DEMAND_THRESHOLD, max_workers=None):
+    """
+    Scans every cell of a grid over the city for gaps: cells further than `min_gap_km` from any mall
+    and inside a high-demand zone. Row bands of ~SCAN_CHUNK_CELLS are processed on a process pool;
+    adjacent gap cells are merged into clusters (8-connectivity).
+    Returns a DataFrame of gap clusters ranked by captured demand.
+    """
+    malls = terrace_assets + competitors if malls is None else malls
+    mall_coords = np.array([m['loc'] for m in malls], dtype=float)
+    # Demand comes from the cached raster at the scan resolution (same grid as the distance bands)
+    demand = get_demand_raster(points, bbox=bbox, resolution_m=resolution_m).values
+
+    lats, lons = _grid_axes(bbox, resolution_m)
+    rows_per_chunk = max(1, SCAN_CHUNK_CELLS // len(lons))
+    tasks = [(lats[i:i + rows_per_chunk], lons, mall_coords) for i in range(0, len(lats), rows_per_chunk)]
+
+    if max_workers == 1:
+        dist = np.vstack([_scan_rows(task) for task in tasks])
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            dist = np.vstack(list(pool.map(_scan_rows, tasks)))
+
+    gap_mask = (dist > min_gap_km) & (demand >= demand_threshold)
+    labels, n_clusters = ndimage.label(gap_mask, structure=np.ones((3, 3)))
+    if n_clusters == 0:
+        return pd.DataFrame(columns=['Cluster', 'Lat', 'Lon', 'Area_km2', 'Demand', 'Peak_Demand', 'Mean_Gap_km'])
+
+    cluster_ids = np.arange(1, n_clusters + 1)
+    lat_grid = np.broadcast_to(lats[:, None], gap_mask.shape)
+    lon_grid = np.broadcast_to(lons[None, :], gap_mask.shape)
+    cells = ndimage.sum_labels(gap_mask, labels, cluster_ids)
+    demand_sum = ndimage.sum_labels(demand, labels, cluster_ids)
+
+    clusters = pd.DataFrame({
+        'Cluster': cluster_ids,
+        # Demand-weighted centroid: where the cluster's customers are
+        'Lat': ndimage.sum_labels(lat_grid * demand, labels, cluster_ids) / demand_sum,
+        'Lon': ndimage.sum_labels(lon_grid * demand, labels, cluster_ids) / demand_sum,
+        'Area_km2': cells * (resolution_m / 1000.0) ** 2,
+        'Demand': demand_sum * (resolution_m / 1000.0) ** 2,
+        'Peak_Demand': ndimage.maximum(demand, labels, cluster_ids),
+        'Mean_Gap_km': ndimage.mean(dist, labels, cluster_ids),
+    })
+    return clusters.sort_values('Demand', ascending=False).reset_index(drop=True)
+
+
+# --- MULTI-CITY ANALYSIS ---
+def city_profile(city=None):
+    """Spatial inputs for `city` (see city_profiles.load_city); None = the module's default-city names."""
+    if city is not None:
+        return city_profiles.load_city(city)
+    return {
+        'name': _default_city['name'], 'country': _default_city['country'],
+        'center': CITY_CENTER, 'zoom': ZOOM_START, 'bbox': CITY_BBOX,
+        'terrace_assets': terrace_assets, 'competitors': competitors,
+        'residential_density': residential_density, 'potential_sites': potential_sites,
+    }
+
+
+def analyze_city(city, resolution_m=SCAN_RESOLUTION_M):
+    """
+    Gap analysis for one city (runs in a worker process): checks the city's candidate sites and
+    scans its bbox for gap clusters. Returns (clusters, sites) DataFrames tagged with City/Country.
+    """
+    profile = city_profile(city)
+    malls = profile['terrace_assets'] + profile['competitors']
+    raster = get_demand_raster(profile['residential_density'], bbox=profile['bbox'])
+
+    clusters = scan_city_grid(bbox=profile['bbox'], resolution_m=resolution_m, malls=malls,
+                              points=profile['residential_density'], max_workers=1)
+
+    site_locs = [site['loc'] for site in profile['potential_sites']]
+    sites = pd.DataFrame({'Site': [site['name'] for site in profile['potential_sites']]})
+    if site_locs:
+        distances, viable = check_viability_batch(site_locs, malls=malls, raster=raster)
+        sites['Gap_km'], sites['Demand'], sites['Viable'] = distances, raster.lookup(site_locs), viable
+        sites['Huff_Capture'], sites['Huff_Share'] = HuffModel.from_raster(raster, malls).score_sites(site_locs)
+
+    for frame in (clusters, sites):
+        frame.insert(0, 'Country', profile['country'])
+        frame.insert(0, 'City', profile['name'])
+    return clusters, sites
+
+
+def run_cities(cities=None, resolution_m=SCAN_RESOLUTION_M, max_workers=None):
+    """
+    Runs analyze_city for many cities in parallel (one process per city).
+    Cities without POI/demand files are skipped with a warning.
+    Returns (opportunities, sites): gap clusters of every city in one table ranked by demand
+    (Rank 1 = largest uncovered demand), and every candidate site's viability.
+    """
+    if cities is None:
+        cities = city_profiles.load_cities().index.tolist()
+
+    ready = []
+    for city in cities:
+        if city_profiles.has_poi_data(city):
+            ready.append(city)
+        else:
+            print(f"[WARN] Skipping {city}: no POI/demand files in {city_profiles.city_dir(city)}")
+    if not ready:
+        return pd.DataFrame(), pd.DataFrame()
+
+    with ProcessPoolExecutor(max_workers=min(len(ready), max_workers or os.cpu_count())) as pool:
+        results = list(pool.map(analyze_city, ready, [resolution_m] * len(ready)))
+
+    opportunities = pd.concat([r[0] for r in results], ignore_index=True)
+    opportunities = opportunities.sort_values('Demand', ascending=False).reset_index(drop=True)
+    opportunities.insert(0, 'Rank', np.arange(1, len(opportunities) + 1))
+    sites = pd.concat([r[1] for r in results], ignore_index=True)
+    return opportunities, sites
+
+
+# --- LIGHTWEIGHT MAP OUTPUT ---
+@functools.lru_cache(maxsize=None)
+def clustered_poi_layer():
+    """The ClusteredPoiLayer class (defined on first use, so non-map callers never import folium)."""
+    from folium.plugins import MarkerCluster
+    from folium.elements import JSCSSMixin
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    class ClusteredPoiLayer(JSCSSMixin, MacroElement):
+        """
+        Marker-clustered layer built in the browser from a GeoJSON FeatureCollection that lives in a
+        separate script file (`var <data_var> = {...};`), so the HTML stays the same size whatever the POI count.
+        A script file rather than a .geojson fetch keeps the map working when opened from disk (file://).
+        """
+        _template = Template("""
+            {% macro script(this, kwargs) %}
+                var {{ this.get_name() }} = L.markerClusterGroup({disableClusteringAtZoom: 15});
+                {{ this.get_name() }}.addLayer(L.geoJSON({{ this.data_var }}, {
+                    pointToLayer: function (feature, latlng) {
+                        var p = feature.properties;
+                        return L.marker(latlng, {
+                            icon: L.AwesomeMarkers.icon({icon: p.icon, prefix: 'fa', markerColor: p.color})
+                        }).bindPopup(p.popup);
+                    }
+                }));
+                {{ this._parent.get_name() }}.addLayer({{ this.get_name() }});
+            {% endmacro %}
+        """)
+
+        default_js = MarkerCluster.default_js
+        default_css = MarkerCluster.default_css
+
+        def __init__(self, data_url, data_var="gapHunterPois"):
+            super().__init__()
+            self._name = "ClusteredPoiLayer"
+            self.data_var = data_var
+            self.default_js = MarkerCluster.default_js + [("gap_hunter_pois", data_url)]
+
+    return ClusteredPoiLayer
+
+
+def _poi_feature(loc, popup, color, icon, kind):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [float(loc[1]), float(loc[0])]},  # GeoJSON is [lon, lat]
+        "properties": {"popup": popup, "color": color, "icon": icon, "kind": kind},
+    }
+
+
+def _tile_bounds(bbox, zoom):
+    """Inclusive XYZ (web mercator) tile ranges covering a bbox."""
+    lat_min, lon_min, lat_max, lon_max = bbox
+    n = 2 ** zoom
+    def tile_x(lon):
+        return int((lon + 180.0) / 360.0 * n)
+    def tile_y(lat):
+        return int((1.0 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2.0 * n)
+    return range(tile_x(lon_min), tile_x(lon_max) + 1), range(tile_y(lat_max), tile_y(lat_min) + 1)
+
+
+def _colorize(norm):
+    """RGBA pixels for normalised demand (0-1) along HEAT_GRADIENT; transparent where there is no demand."""
+    stops = [0.0] + list(HEAT_GRADIENT)
+    rgb = [(0, 0, 255)] + [{'blue': (0, 0, 255), 'lime': (0, 255, 0), 'red': (255, 0, 0)}[c] for c in HEAT_GRADIENT.values()]
+    rgb = np.array(rgb, dtype=float)
+    pixels = np.empty(norm.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        pixels[..., channel] = np.interp(norm, stops, rgb[:, channel])
+    pixels[..., 3] = np.where(norm < 0.05, 0, np.clip(norm / stops[1], 0, 1) * 180)
+    return pixels
+
+
+@timed("gis.heat_tiles")
+def write_heat_tiles(raster, tile_dir, zooms=HEAT_TILE_ZOOMS, tile_size=256):
+    """
+    Pre-renders the demand raster as XYZ PNG tiles: tile_dir/{z}/{x}/{y}.png.
+    Each pixel is one O(1) raster lookup; fully transparent tiles are not written.
+    Returns the number of tiles written.
+    """
+    if Image is None:
+        print("[WARN] Pillow not installed: skipping heatmap tiles.")
+        return 0
+
+    vmax = float(np.max(raster.values)) or 1.0
+    bbox = raster.meta['bbox']
+    offsets = (np.arange(tile_size) + 0.5) / tile_size
+    written = 0
+    for zoom in zooms:
+        n = 2 ** zoom
+        xs, ys = _tile_bounds(bbox, zoom)
+        for x in xs:
+            lons = (x + offsets) / n * 360.0 - 180.0
+            for y in ys:
+                lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+                lat_grid, lon_grid = np.meshgrid(lats, lons, indexing='ij')
+                demand = raster.lookup(np.column_stack([lat_grid.ravel(), lon_grid.ravel()]))
+                pixels = _colorize(demand.reshape(tile_size, tile_size) / vmax)
+                if not pixels[..., 3].any():
+                    continue
+                path = os.path.join(tile_dir, str(zoom), str(x), f"{y}.png")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                Image.fromarray(pixels, mode="RGBA").save(path, optimize=True)
+                written += 1
+    return written
+
+
+@timed("gis.generate_map")
+def generate_map(light=None, output_file=None, city=None):
+    """
+    Draws the Gap Hunter map for `city` (default: the module's default city).
+    `light` selects the lightweight output (external POI data, marker clustering, pre-rendered
+    heatmap tiles); by default it is used from LIGHT_MAP_MIN_POIS points.
+    """
+    profile = city_profile(city)
+    output_file = output_file or MAP_FILE.format(city=city_profiles.city_slug(profile['name']))
+    n_pois = len(profile['terrace_assets']) + len(profile['competitors']) + len(profile['potential_sites'])
+    if light is None:
+        light = n_pois >= LIGHT_MAP_MIN_POIS
+
+    # Map libraries are loaded here rather than at import, so scans and viability checks start faster
+    import folium
+    from folium.plugins import HeatMap
+
+    m = folium.Map(location=profile['center'], zoom_start=profile['zoom'], tiles="CartoDB dark_matter")
+    raster = get_demand_raster(profile['residential_density'], bbox=profile['bbox'])
+    features = []
+
+    # A. Draw Heatmap (Where the people live), from the demand raster
+    if light:
+        data_dir = os.path.splitext(output_file)[0] + "_files"
+        n_tiles = write_heat_tiles(raster, os.path.join(data_dir, "heat"))
+        if n_tiles:
+            folium.TileLayer(
+                tiles=f"{os.path.basename(data_dir)}/heat/{{z}}/{{x}}/{{y}}.png", attr="Residential demand",
+                name="Demand Heatmap", overlay=True, opacity=0.8,
+                min_zoom=min(HEAT_TILE_ZOOMS), max_native_zoom=max(HEAT_TILE_ZOOMS), max_zoom=18,
+            ).add_to(m)
+    else:
+        # Inlined in the HTML: the source points when few, else a coarse raster sample (tiles are light-mode only)
+        density = profile['residential_density']
+        heat = density if len(density) <= HEAT_MAX_POINTS else raster.heat_points()
+        HeatMap(heat, radius=25, blur=15, gradient=HEAT_GRADIENT).add_to(m)
 
     # B. Plot Existing Assets (Blue)
-    for site in terrace_assets:
+    for site in profile['terrace_assets']:
         popup_html = f"<div style='width:150px'><b>{site['name']}</b><br>{site['status']}</div>"
+        if light:
+            features.append(_poi_feature(site["loc"], popup_html, "blue", "building", "asset"))
+            continue
         folium.Marker(site["loc"], popup=popup_html, icon=folium.Icon(color="blue", icon="building", prefix="fa")).add_to(m)
         folium.Circle(site["loc"], radius=3000, color="#0066cc", fill=False).add_to(m)
 
     # C. Plot Competitors (Red)
-    for site in competitors:
+    for site in profile['competitors']:
+        if light:
+            features.append(_poi_feature(site["loc"], site["name"], "red", "shopping-cart", "competitor"))
+            continue
         folium.Marker(site["loc"], popup=site["name"], icon=folium.Icon(color="red", icon="shopping-cart", prefix="fa")).add_to(m)
         folium.Circle(site["loc"], radius=3000, color="#ff0000", fill=False).add_to(m)
 
     # D. Run Gap Hunter Algorithm
     print("\n🔎 EXECUTING SPATIAL ALGORITHM...")
-    for site in potential_sites:
-        dist, is_viable = check_viability(site["loc"])
+    site_locs = [site["loc"] for site in profile['potential_sites']]
+    distances, viable = check_viability_batch(site_locs, malls=profile['terrace_assets'] + profile['competitors'], raster=raster)
+    demand = raster.lookup(site_locs)
+    _, huff_share = HuffModel.from_raster(raster, profile['terrace_assets'] + profile['competitors']).score_sites(site_locs)
+    for site, dist, is_viable, site_demand, share in zip(profile['potential_sites'], distances, viable, demand, huff_share):
         
         if is_viable:
-            print(f"✅ FOUND: {site['name']} (Gap: {dist:.1f}km)")
-            folium.Marker(
-                site["loc"],
-                popup=f"<b>RECOMMENDED SITE</b><br>{site['name']}<br>Nearest Mall: {dist:.1f}km away",
-                icon=folium.Icon(color="green", icon="star", prefix="fa")
-            ).add_to(m)
+            print(f"✅ FOUND: {site['name']} (Gap: {dist:.1f}km, Huff Share: {share:.0%})")
+            popup, color, icon = (f"<b>RECOMMENDED SITE</b><br>{site['name']}<br>Nearest Mall: {dist:.1f}km away"
+                                  f"<br>Huff Share: {share:.0%} of nearby demand"), "green", "star"
         else:
-            print(f"❌ REJECTED: {site['name']} (Gap: {dist:.1f}km)")
-            folium.Marker(
-                site["loc"],
-                popup="Rejected: Too Congested",
-                icon=folium.Icon(color="gray", icon="ban", prefix="fa")
-            ).add_to(m)
+            reason = "Too Congested" if dist <= VIABILITY_RADIUS_KM else "Low Residential Demand"
+            print(f"❌ REJECTED: {site['name']} (Gap: {dist:.1f}km, Demand: {site_demand:.2f})")
+            popup, color, icon = f"Rejected: {reason}", "gray", "ban"
+
+        if light:
+            features.append(_poi_feature(site["loc"], popup, color, icon, "site"))
+        else:
+            folium.Marker(site["loc"], popup=popup, icon=folium.Icon(color=color, icon=icon, prefix="fa")).add_to(m)
+
+    # E. Lightweight output: every point in one external data file, clustered in the browser
+    if light:
+        data_file = os.path.join(data_dir, "pois.js")
+        os.makedirs(data_dir, exist_ok=True)
+        with open(data_file, "w", encoding="utf-8") as f:
+            f.write("var gapHunterPois = ")
+            json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"))
+            f.write(";\n")
+        clustered_poi_layer()(f"{os.path.basename(data_dir)}/pois.js").add_to(m)
+        folium.LayerControl().add_to(m)
+        print(f"[INFO] Lightweight map: {len(features)} points in {data_file}, {n_tiles} heatmap tiles.")
 
-    output_file = "harare_gap_hunter.html"
     m.save(output_file)
     print(f"🚀 Map Generated: {output_file}")
+    import webbrowser
     webbrowser.open('file://' + os.path.realpath(output_file))
 
 if __name__ == "__main__":
-    generate_map()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Gap Hunter")
+    parser.add_argument("--city", default=None, help="City from data/cities/cities.csv (default: Harare).")
+    parser.add_argument("--all-cities", action="store_true", help="Scan every city with POI data and print one combined ranking.")
+    parser.add_argument("--scan", action="store_true", help="Scan a city-wide grid for gap clusters instead of drawing the map.")
+    parser.add_argument("--resolution", type=float, default=SCAN_RESOLUTION_M, help="Grid cell size in metres for --scan.")
+    parser.add_argument("--light", action="store_true", help="Lightweight map: external POI data, marker clustering, heatmap tiles.")
+    args = parser.parse_args()
+
+    if args.all_cities:
+        print(f"\n🌍 SCANNING ALL CITIES ({args.resolution:.0f}m cells)...")
+        opportunities, sites = run_cities(resolution_m=args.resolution)
+        print(opportunities.head(20).to_string(index=False))
+        print(sites.to_string(index=False))
+    elif args.scan:
+        profile = city_profile(args.city)
+        print(f"\n🔎 SCANNING {profile['name'].upper()} GRID ({args.resolution:.0f}m cells)...")
+        print(scan_city_grid(bbox=profile['bbox'], resolution_m=args.resolution,
+                             malls=profile['terrace_assets'] + profile['competitors'],
+                             points=profile['residential_density']).head(10).to_string(index=False))
+    else:
+        generate_map(light=True if args.light else None, city=args.city)
+    print_summary()
\ No newline at end of file
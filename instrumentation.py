@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import threading
+import functools
+import tracemalloc
+import contextlib
+from collections import deque
+import numpy as np
+
+# --- CONFIGURATION ---
+# Opt-in: unset / "0" -> off (stages cost one flag check), "time" -> wall time + call counts,
+# any other value (e.g. "1") -> also peak traced memory per stage (tracemalloc, slower)
+PROFILE_ENV = "CAPITAL_FLOW_PROFILE"
+ROLLING_WINDOW = 512   # Samples kept per stage for the quantiles / peak memory
+BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = "capital_flow"
+
+_mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+ENABLED = _mode not in ("", "0", "false", "off", "no")
+TRACK_MEMORY = ENABLED and _mode != "time"
+
+# Per-stage stats, shared by every thread (dashboard sessions) of this process.
+# Worker processes (ProcessPoolExecutor) keep their own, unreported copies.
+_stats = {}
+_lock = threading.Lock()
+# Open memory-tracked stages per thread. tracemalloc has one process-wide peak, so a stage that
+# overlaps another thread's stage cannot attribute its peak and records None instead.
+_open_stages = {}
+_NULL = contextlib.nullcontext()
+
+
+def enable(memory=True):
+    """Turns instrumentation on at runtime (same as setting CAPITAL_FLOW_PROFILE before start)."""
+    global ENABLED, TRACK_MEMORY
+    ENABLED, TRACK_MEMORY = True, memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global ENABLED, TRACK_MEMORY
+    ENABLED = TRACK_MEMORY = False
+
+
+def record(name, seconds, peak_bytes=None):
+    """Adds one sample for a stage (used by stage()/timed(); callable directly for external timings)."""
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = {
+                'calls': 0, 'total_s': 0.0, 'buckets': [0] * (len(BUCKETS_S) + 1),
+                'window': deque(maxlen=ROLLING_WINDOW),
+            }
+        entry['calls'] += 1
+        entry['total_s'] += seconds
+        entry['buckets'][int(np.searchsorted(BUCKETS_S, seconds))] += 1
+        entry['window'].append((seconds, peak_bytes))
+
+
+class _Stage:
+    """One timed stage. Nested stages pass their memory peak up to the enclosing stage."""
+
+    __slots__ = ('name', 'start', 'mem_start', 'mem_peak', 'shared')
+
+    def __init__(self, name):
+        self.name = name
+        self.mem_start = None
+        self.shared = False
+
+    def __enter__(self):
+        if TRACK_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            with _lock:
+                stack = _open_stages.setdefault(threading.get_ident(), [])
+                if len(_open_stages) > 1:
+                    # Another thread has a stage open: the reset below would wipe its peak, and its
+                    # allocations would land in ours. Neither side can report a memory peak.
+                    self.shared = True
+                    for open_stack in _open_stages.values():
+                        for open_stage in open_stack:
+                            open_stage.shared = True
+                current, peak = tracemalloc.get_traced_memory()
+                if stack:
+                    stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+                tracemalloc.reset_peak()
+                self.mem_start = self.mem_peak = current
+                stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak_bytes = None
+        if self.mem_start is not None:
+            with _lock:
+                ident = threading.get_ident()
+                stack = _open_stages.get(ident)
+                if stack and stack[-1] is self:
+                    stack.pop()
+                    if not stack:
+                        del _open_stages[ident]
+                    self.mem_peak = max(self.mem_peak, tracemalloc.get_traced_memory()[1])
+                    if not self.shared:
+                        peak_bytes = self.mem_peak - self.mem_start
+                    if stack:
+                        stack[-1].mem_peak = max(stack[-1].mem_peak, self.mem_peak)
+        record(self.name, seconds, peak_bytes)
+        return False
+
+
+def stage(name):
+    """Context manager timing one stage, e.g. `with stage("model.forecast"): ...`. No-op when disabled."""
+    return _Stage(name) if ENABLED else _NULL
+
+
+def timed(name):
+    """Decorator form of stage(): every call of the function is recorded under `name`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- EXPORT ---
+def snapshot():
+    """
+    Per-stage summary, slowest total first:
+    {stage: {calls, total_s, mean_s, p50_s, p95_s, max_s, last_s, peak_mem_mb}}.
+    Quantiles, max and peak memory cover the last ROLLING_WINDOW calls; calls/total are lifetime.
+    """
+    with _lock:
+        entries = {name: (e['calls'], e['total_s'], list(e['window'])) for name, e in _stats.items()}
+
+    summary = {}
+    for name, (calls, total_s, window) in entries.items():
+        seconds = np.array([s for s, _ in window])
+        peaks = [p for _, p in window if p is not None]
+        summary[name] = {
+            'calls': calls,
+            'total_s': total_s,
+            'mean_s': total_s / calls,
+            'p50_s': float(np.quantile(seconds, 0.5)),
+            'p95_s': float(np.quantile(seconds, 0.95)),
+            'max_s': float(seconds.max()),
+            'last_s': float(seconds[-1]),
+            'peak_mem_mb': max(peaks) / 2**20 if peaks else None,
+        }
+    return dict(sorted(summary.items(), key=lambda item: -item[1]['total_s']))
+
+
+def export_json(path=None):
+    """Snapshot as JSON text; also written to `path` (atomically) when given."""
+    text = json.dumps({'generated_at': time.time(), 'stages': snapshot()}, indent=2)
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    return text
+
+
+def export_prometheus():
+    """Prometheus text exposition: a lifetime histogram per stage plus rolling quantile / memory gauges."""
+    with _lock:
+        buckets = {name: (list(e['buckets']), e['calls'], e['total_s']) for name, e in _stats.items()}
+    summary = snapshot()
+
+    seconds = f"{METRIC_PREFIX}_stage_seconds"
+    lines = [f"# HELP {seconds} Wall time per instrumented stage.", f"# TYPE {seconds} histogram"]
+    for name, (counts, calls, total_s) in sorted(buckets.items()):
+        cumulative = np.cumsum(counts)
+        for bound, count in zip(BUCKETS_S, cumulative):
+            lines.append(f'{seconds}_bucket{{stage="{name}",le="{bound}"}} {count}')
+        lines.append(f'{seconds}_bucket{{stage="{name}",le="+Inf"}} {calls}')
+        lines.append(f'{seconds}_sum{{stage="{name}"}} {total_s:.6f}')
+        lines.append(f'{seconds}_count{{stage="{name}"}} {calls}')
+
+    window = f"{METRIC_PREFIX}_stage_window_seconds"
+    lines += [f"# HELP {window} Wall time quantiles over the last {ROLLING_WINDOW} calls.", f"# TYPE {window} gauge"]
+    for name, s in sorted(summary.items()):
+        lines.append(f'{window}{{stage="{name}",quantile="0.5"}} {s["p50_s"]:.6f}')
+        lines.append(f'{window}{{stage="{name}",quantile="0.95"}} {s["p95_s"]:.6f}')
+
+    memory = f"{METRIC_PREFIX}_stage_peak_bytes"
+    lines += [f"# HELP {memory} Peak traced memory of one call over the last {ROLLING_WINDOW} calls.",
+              f"# TYPE {memory} gauge"]
+    for name, s in sorted(summary.items()):
+        if s['peak_mem_mb'] is not None:
+            lines.append(f'{memory}{{stage="{name}"}} {int(s["peak_mem_mb"] * 2**20)}')
+    return "\n".join(lines) + "\n"
+
+
+def print_summary():
+    """Console table of the snapshot (CLI scripts call this on exit; silent when disabled)."""
+    if not ENABLED or not _stats:
+        return
+    print("⏱️ Stage timings:")
+    for name, s in snapshot().items():
+        memory = f"{s['peak_mem_mb']:8.1f} MB" if s['peak_mem_mb'] is not None else ""
+        print(f"[INFO] {name:<28} {s['calls']:>6} calls  {s['total_s'] * 1e3:>10.1f} ms total  "
+              f"p95 {s['p95_s'] * 1e3:>8.2f} ms  {memory}")
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+if TRACK_MEMORY:
+    tracemalloc.start()
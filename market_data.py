@@ -0,0 +1,156 @@
+import os
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+CACHE_DIR = "data/drivers"  # One CSV per ticker: Date (month start), Close
+
+# Yahoo tickers -> model column names
+# CL=F: Crude Oil | DX-Y.NYB: USD Index | GC=F: Gold | PL=F: Platinum
+TICKERS = {
+    'CL=F': 'Oil_Price',
+    'DX-Y.NYB': 'USD_Index',
+    'GC=F': 'Gold_Price',
+    'PL=F': 'Platinum_Price'
+}
+
+
+# --- PROVIDERS ---
+# Any object with fetch(tickers, start, end) -> DataFrame of monthly closes
+# (index: month-start dates, columns: tickers) can feed the driver cache.
+
+class YahooProvider:
+    """Monthly closes from Yahoo Finance."""
+
+    def fetch(self, tickers, start, end):
+        import yfinance as yf
+
+        raw_data = yf.download(list(tickers), start=start, end=end, interval="1mo", progress=False)
+        if raw_data.empty:
+            raise ValueError("Yahoo Finance returned empty data.")
+
+        # Smart Column Selection
+        if 'Adj Close' in raw_data.columns:
+            closes = raw_data['Adj Close'].copy()
+        elif 'Close' in raw_data.columns:
+            print("[WARN] 'Adj Close' missing. Using 'Close' instead.")
+            closes = raw_data['Close'].copy()
+        else:
+            # Fallback: assume Yahoo's alphabetical ticker order
+            closes = raw_data.iloc[:, :len(tickers)].copy()
+            closes.columns = sorted(tickers)
+
+        closes.index = pd.DatetimeIndex(closes.index).tz_localize(None).to_period('M').to_timestamp()
+        return closes
+
+
+class OfflineProvider:
+    """
+    Network-free stand-in for tests and benchmarks.
+    Serves a given frame of monthly closes, or a seeded random walk per ticker.
+    """
+
+    def __init__(self, frame=None, start="2005-01-01", end=None, seed=0):
+        if frame is None:
+            months = pd.date_range(start=start, end=end or pd.Timestamp.today(), freq='MS')
+            rng = np.random.default_rng(seed)
+            walks = 100 * np.exp(np.cumsum(rng.normal(0, 0.05, (len(months), len(TICKERS))), axis=0))
+            frame = pd.DataFrame(walks, index=months, columns=list(TICKERS))
+        self.frame = frame
+        self.calls = []  # (tickers, start, end) per fetch, so tests can assert what was requested
+
+    def fetch(self, tickers, start, end):
+        self.calls.append((list(tickers), start, end))
+        window = self.frame.loc[(self.frame.index >= pd.Timestamp(start)) & (self.frame.index < pd.Timestamp(end))]
+        return window[[t for t in tickers if t in window.columns]]
+
+
+# --- LOCAL DRIVER CACHE ---
+class DriverCache:
+    """
+    Local cache of monthly closes keyed by ticker and month.
+    Only completed months are stored, and a cached close never changes once written.
+    Months missing inside a ticker's cached range (a failed or empty fetch) are requested
+    again on the next update and inserted in place.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, ticker):
+        safe = "".join(ch if ch.isalnum() else "_" for ch in ticker)
+        return os.path.join(self.cache_dir, f"{safe}.csv")
+
+    def load(self, ticker):
+        """Cached closes for one ticker as a Series indexed by month start."""
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return pd.Series(dtype=float, name=ticker)
+        cached = pd.read_csv(path, parse_dates=['Date'], index_col='Date')['Close']
+        return cached.rename(ticker)
+
+    def _write(self, ticker, cached, new):
+        """Appends `new` when it follows the cached tail, else rewrites the file (temp + rename) with the gaps filled."""
+        path = self._path(ticker)
+        if cached.empty or new.index.min() > cached.index.max():
+            write_header = not os.path.exists(path)
+            with open(path, "a", encoding="utf-8") as f:
+                if write_header:
+                    f.write("Date,Close\n")
+                for month, value in new.items():
+                    f.write(f"{month:%Y-%m-%d},{float(value)!r}\n")
+            return
+
+        merged = pd.concat([cached, new]).sort_index()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("Date,Close\n")
+            for month, value in merged.items():
+                f.write(f"{month:%Y-%m-%d},{float(value)!r}\n")
+        os.replace(tmp_path, path)
+
+    def update(self, provider, tickers=TICKERS, start_date="2005-01-01", today=None):
+        """
+        Fetches only the months missing from the cache: gaps inside each ticker's cached range
+        and the months after its last cached one (one provider call for all tickers).
+        Returns {ticker: months added}.
+        """
+        current_month = pd.Timestamp(today or pd.Timestamp.today()).to_period('M').to_timestamp()
+        first_month = pd.Timestamp(start_date).to_period('M').to_timestamp()
+        cached = {t: self.load(t) for t in tickers}
+        missing = {}
+        for t, series in cached.items():
+            # End is exclusive: the in-progress month is never cached (its close is not final yet)
+            months = pd.date_range(first_month if series.empty else series.index.min(), current_month,
+                                   freq='MS', inclusive='left')
+            missing[t] = months.difference(series.index)
+
+        stale = [t for t in tickers if len(missing[t])]
+        added = {t: 0 for t in tickers}
+        if not stale:
+            return added
+
+        fetch_start = min(missing[t].min() for t in stale)
+        closes = provider.fetch(stale, fetch_start.strftime('%Y-%m-%d'), current_month.strftime('%Y-%m-%d'))
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for ticker in stale:
+            if ticker not in closes.columns:
+                continue
+            new = closes[ticker].dropna()
+            new = new[new.index.isin(missing[ticker])]
+            if new.empty:
+                continue
+            self._write(ticker, cached[ticker], new)
+            added[ticker] = len(new)
+        return added
+
+    def frame(self, tickers=TICKERS):
+        """Cached closes for all tickers side by side, renamed to the model's driver columns."""
+        series = [self.load(t) for t in tickers]
+        series = [s for s in series if not s.empty]
+        if not series:
+            return pd.DataFrame()
+        wide = pd.concat(series, axis=1).sort_index()
+        wide.index.name = 'Date'
+        return wide.rename(columns=TICKERS)
@@ -0,0 +1,113 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# --- CONFIGURATION ---
+MODEL_CACHE_DIR = "cache/models"
+MAX_MODELS = 32  # In-memory LRU capacity (fitted models are small)
+
+_models = OrderedDict()
+_lock = threading.Lock()
+
+
+def make_key(country_name, columns, version):
+    """Cache key: (country, column set, dataset version)."""
+    return (country_name, tuple(columns), version)
+
+
+def _disk_path(key):
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+    return os.path.join(MODEL_CACHE_DIR, f"{digest}.npz")
+
+
+class FittedVAR:
+    """
+    Fitted VAR coefficients with the parts of VARResults the engines use (k_ar, params, coefs,
+    sigma_u, forecast). Built from plain arrays, so a stored model loads without statsmodels.
+    """
+
+    def __init__(self, params, sigma_u, lag_order):
+        self.params = np.asarray(params, dtype=float)    # Rows: [const, lag 1 block, ..., lag p block]
+        self.sigma_u = np.asarray(sigma_u, dtype=float)
+        self.k_ar = int(lag_order)
+
+    @property
+    def coefs(self):
+        k = self.params.shape[1]
+        return self.params[1:].reshape(self.k_ar, k, k).transpose(0, 2, 1)
+
+    def forecast(self, y, steps):
+        from model_engine import var_forecast  # model_engine imports this module
+        return var_forecast(self.params, y, self.k_ar, steps)
+
+
+def _save(key, var_result):
+    """Persists the fitted coefficients (write-to-temp then rename, so readers never see half a file)."""
+    path = _disk_path(key)
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            params=np.asarray(var_result.params),
+            sigma_u=np.asarray(var_result.sigma_u),
+            lag_order=var_result.k_ar,
+            key=repr(key),
+        )
+    os.replace(tmp_path, path)
+
+
+def _load(key):
+    path = _disk_path(key)
+    try:
+        with np.load(path) as stored:
+            if str(stored["key"]) != repr(key):
+                return None  # Hash collision or stale file
+            return FittedVAR(stored["params"], stored["sigma_u"], int(stored["lag_order"]))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _remember(key, var_result):
+    with _lock:
+        _models[key] = var_result
+        _models.move_to_end(key)
+        while len(_models) > MAX_MODELS:
+            _models.popitem(last=False)
+
+
+def get_or_fit(country_name, train_df, version, fit_fn):
+    """
+    Returns the fitted VAR for (country, columns, version).
+    Lookup order: in-memory LRU -> coefficients on disk -> fit_fn(train_df).
+    """
+    key = make_key(country_name, train_df.columns, version)
+
+    with _lock:
+        var_result = _models.get(key)
+        if var_result is not None:
+            _models.move_to_end(key)
+            return var_result
+
+    var_result = _load(key)
+    if var_result is None:
+        var_result = fit_fn(train_df)
+        try:
+            _save(key, var_result)
+        except OSError:
+            pass  # Read-only deployments still get the in-memory cache
+
+    _remember(key, var_result)
+    return var_result
+
+
+def clear(disk=False):
+    """Empties the in-memory LRU (and optionally the on-disk coefficient store)."""
+    with _lock:
+        _models.clear()
+    if disk and os.path.isdir(MODEL_CACHE_DIR):
+        for name in os.listdir(MODEL_CACHE_DIR):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(MODEL_CACHE_DIR, name))
@@ -1,28 +1,176 @@
 import pandas as pd
 import numpy as np
-from statsmodels.tsa.api import VAR
 import warnings
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import data_store
+import model_cache
+from instrumentation import stage, timed
 
 warnings.filterwarnings("ignore")
 
-def train_and_forecast(country_name, steps=24):
+CONFIG_FILE = "config_countries.csv"
+
+# Lag selection mode for fit_var:
+#   "fast"        -> one lagged design + one QR, nested least squares per order
+#   "statsmodels" -> VAR.select_order followed by VAR.fit (reference implementation)
+LAG_SELECTION = "fast"
+
+def lagged_design(values, maxlags):
     """
-    Trains a VAR model for a specific country and forecasts future FDI.
-    Returns: Historical Data + Forecast Data combined.
+    Builds the VAR regressor matrix once at the maximum lag.
+    Row t is [1, y(t-1), ..., y(t-maxlags)] (NaN where the lag falls before the sample),
+    so the design for any order p and any window starting at s is X[s+p:, :1+k*p].
+    """
+    nobs, k = values.shape
+    X = np.full((nobs, 1 + k * maxlags), np.nan)
+    X[:, 0] = 1.0
+    for lag in range(1, maxlags + 1):
+        X[lag:, 1 + k * (lag - 1):1 + k * lag] = values[:-lag]
+    return X
+
+def select_lag_order(values, maxlags, X=None, start=0, end=None):
+    """
+    AIC/BIC/HQIC for every order 0..maxlags from a single QR of the max-lag design.
+    Same sample and criteria as statsmodels' VAR.select_order (every order uses the
+    observations after the first `maxlags`), so it selects the same orders.
+    Returns: ({'aic': p, 'bic': p, 'hqic': p}, {'aic': [...], 'bic': [...], 'hqic': [...]}).
+    """
+    end = len(values) if end is None else end
+    k = values.shape[1]
+
+    # Same guard as statsmodels: the largest model must be estimable
+    max_estimable = (end - start - k - 1) // (1 + k)
+    if maxlags > max_estimable:
+        raise ValueError("maxlags is too large for the number of observations.")
+
+    if X is None:
+        values = values[start:end]
+        X = lagged_design(values, maxlags)
+        start, end = 0, len(values)
+
+    Y = values[start + maxlags:end]
+    Z = X[start + maxlags:end, :1 + k * maxlags]
+    nobs = len(Y)
+
+    # Nested least squares: the leading columns of Q span the design of every smaller order.
+    # SSE(p) = SSE(maxlags) + sum of the squared projections dropped beyond column 1+k*p.
+    Q, R = np.linalg.qr(Z)
+    QtY = Q.T @ Y
+    resid = Y - Q @ QtY
+    sse = resid.T @ resid
+
+    ics = {'aic': [], 'bic': [], 'hqic': []}
+    for p in range(maxlags, -1, -1):
+        if p < maxlags:
+            dropped = QtY[1 + k * p:1 + k * (p + 1)]
+            sse = sse + dropped.T @ dropped
+
+        df_resid = nobs - (k * p + 1)
+        if df_resid:
+            ld = 2 * np.log(np.diag(np.linalg.cholesky(sse / nobs))).sum()
+        else:
+            ld = -np.inf
+        free_params = p * k ** 2 + k
+        ics['aic'].append(ld + (2.0 / nobs) * free_params)
+        ics['bic'].append(ld + (np.log(nobs) / nobs) * free_params)
+        ics['hqic'].append(ld + (2.0 * np.log(np.log(nobs)) / nobs) * free_params)
+
+    ics = {name: values_[::-1] for name, values_ in ics.items()}
+    selected = {name: int(np.argmin(values_)) for name, values_ in ics.items()}
+    return selected, ics
+
+def ols_var(values, lag_order, X=None, start=0, end=None):
+    """
+    Solves the VAR(p) equations on rows [start+p, end) of the shared lagged design.
+    Returns (params, sigma_u) exactly as VAR.fit computes them.
+    """
+    end = len(values) if end is None else end
+    k = values.shape[1]
+    if X is None:
+        values = values[start:end]
+        X = lagged_design(values, lag_order)
+        start, end = 0, len(values)
+
+    Y = values[start + lag_order:end]
+    Z = X[start + lag_order:end, :1 + k * lag_order]
+    params = np.linalg.lstsq(Z, Y, rcond=1e-15)[0]
+    resid = Y - Z @ params
+
+    df_resid = len(Y) - (k * lag_order + 1)
+    sse = resid.T @ resid
+    sigma_u = sse / df_resid if df_resid else np.full_like(sse, np.nan)
+    return params, sigma_u
+
+def var_forecast(params, history, lag_order, steps):
+    """
+    Point forecast straight from OLS params (rows: [const, lag 1 block, ..., lag p block]).
+    Same recursion as VARResults.forecast, without building a results object.
     """
-    # 1. Load Data
+    k = params.shape[1]
+    intercept = params[0]
+    coefs = params[1:].reshape(lag_order, k, k)  # coefs[i] maps y(t-1-i) -> y(t)
+
+    state = list(np.asarray(history, dtype=float)[len(history) - lag_order:])
+    out = np.empty((steps, k))
+    for t in range(steps):
+        y = intercept.copy()
+        for lag in range(lag_order):
+            y += state[-1 - lag] @ coefs[lag]
+        out[t] = y
+        state.append(y)
+    return out
+
+def max_lags_for(nobs):
+    """Largest lag order worth searching for a sample of `nobs` rows."""
+    # Dynamic Max Lags: Never ask for more lags than the data supports
+    # Rule of thumb: We need at least 10 observations per lag roughly
+    max_possible_lags = nobs // 10
+    # If data is really short, default to lag 1
+    return max(1, min(12, max_possible_lags))
+
+def _statsmodels_var(train_df):
+    """statsmodels VAR for train_df. Call inside warnings.catch_warnings(): the filter change is scoped there."""
+    # Imported on first use: statsmodels adds ~1s to startup and the fast path never needs it
+    from statsmodels.tsa.api import VAR
+    warnings.simplefilter("ignore")  # After the import, which adds its own filters (date-frequency warnings)
+    return VAR(train_df)
+
+@timed("model.fit")
+def fit_var(train_df):
+    """
+    Selects the lag order by AIC and fits the VAR (the expensive step).
+    Returns the fitted model: a model_cache.FittedVAR on the fast path, else statsmodels VARResults.
+    """
+    safe_maxlags = max_lags_for(len(train_df))
+
     try:
-        df = pd.read_csv("data/semi_synthetic_fdi.csv")
-    except FileNotFoundError:
-        return pd.DataFrame(), "❌ Data Missing"
+        if LAG_SELECTION == "fast":
+            values = train_df.values.astype(float)
+            X = lagged_design(values, safe_maxlags)
+            with stage("model.select_order"):
+                best_lag = select_lag_order(values, safe_maxlags, X=X)[0]['aic']
+            params, sigma_u = ols_var(values, best_lag, X=X)
+            return model_cache.FittedVAR(params, sigma_u, best_lag)
 
-    df['Date'] = pd.to_datetime(df['Date'])
-    
-    # Filter for specific country
-    country_df = df[df['Country'] == country_name].copy()
-    country_df = country_df.sort_values('Date').set_index('Date')
-    
-    # 2. Prepare Variables for VAR
+        with warnings.catch_warnings():
+            model = _statsmodels_var(train_df)
+            with stage("model.select_order"):
+                best_lag = model.select_order(maxlags=safe_maxlags).aic
+            return model.fit(best_lag)
+    except Exception:
+        # Fallback if AIC fails: force a simple 1-month lag model
+        with warnings.catch_warnings():
+            return _statsmodels_var(train_df).fit(1)
+
+@timed("model.load")
+def load_training_frame(country_name):
+    """
+    Returns (train_df, None) with the model variables for one country,
+    or (None, error_signal) if the data is missing or too short.
+    """
+    # Variables for VAR
     # UPDATE: We now look for Gold and Platinum columns to drive the SA/Zim models
     possible_cols = [
         'FDI_Inflows_MillionUSD', 
@@ -34,42 +182,62 @@ def train_and_forecast(country_name, steps=24):
         'Gold_Price',       # <-- NEW
         'Platinum_Price'    # <-- NEW
     ]
+
+    # 1. Load Data (only this country's partition & columns; cached until the file changes)
+    try:
+        country_df, version = data_store.get_country_snapshot(country_name, columns=possible_cols)
+    except FileNotFoundError:
+        return None, "❌ Data Missing"
     
-    # Dynamic Column Selection: Only keep columns that actually exist in the CSV.
+    # 2. Dynamic Column Selection: Only keep columns that actually exist in the CSV.
     # This prevents the app from crashing if you use an old dataset without minerals.
     valid_cols = [c for c in possible_cols if c in country_df.columns]
     
     train_df = country_df[valid_cols].dropna()
+    # Version of the snapshot these rows came from (keys the model cache)
+    train_df.attrs['dataset_version'] = version
     
     # SAFETY CHECK: Ensure we have enough data
     if len(train_df) < 15:
-        return pd.DataFrame(), "⚠️ Insufficient Data"
+        return None, "⚠️ Insufficient Data"
 
-    # 3. Fit VAR Model (ROBUST FIX)
-    model = VAR(train_df)
-    
-    # Dynamic Max Lags: Never ask for more lags than the data supports
-    # Rule of thumb: We need at least 10 observations per lag roughly
-    max_possible_lags = len(train_df) // 10
-    safe_maxlags = min(12, max_possible_lags)
-    
-    # If data is really short, default to lag 1
-    if safe_maxlags < 1:
-        safe_maxlags = 1
+    return train_df, None
 
-    try:
-        best_lag = model.select_order(maxlags=safe_maxlags).aic
-        var_result = model.fit(best_lag)
-    except:
-        # Fallback if AIC fails: force a simple 1-month lag model
-        var_result = model.fit(1)
+def fitted_model(country_name, train_df):
+    """Fitted VAR for a training frame from load_training_frame (cached per dataset version)."""
+    return model_cache.get_or_fit(country_name, train_df, train_df.attrs['dataset_version'], fit_var)
+
+def train_and_forecast(country_name, steps=24):
+    """
+    Trains a VAR model for a specific country and forecasts future FDI.
+    Returns: Historical Data + Forecast Data combined.
+    """
+    # 1-2. Load Data & Prepare Variables for VAR
+    train_df, error = load_training_frame(country_name)
+    if error:
+        return pd.DataFrame(), error
+
+    # 3. Fit VAR Model (cached: the fit does not depend on the forecast horizon)
+    var_result = fitted_model(country_name, train_df)
     
     # 4. Forecast
     lag_order = var_result.k_ar
     input_data = train_df.values[-lag_order:]
     
-    forecast_prediction = var_result.forecast(y=input_data, steps=steps)
+    with stage("model.forecast"):
+        forecast_prediction = var_result.forecast(y=input_data, steps=steps)
     
+    # 5-6. Structure the Forecast Output & Combine with History
+    return assemble_forecast(train_df, forecast_prediction)
+
+def assemble_forecast(train_df, forecast_prediction):
+    """
+    History + Forecast rows (with a 'Type' column) and the heating/cooling signal
+    for a (steps x variables) point forecast that follows train_df.
+    """
+    valid_cols = list(train_df.columns)
+    steps = len(forecast_prediction)
+
     # 5. Structure the Forecast Output
     last_date = train_df.index[-1]
     forecast_dates = pd.date_range(start=last_date, periods=steps+1, freq='M')[1:]
@@ -92,6 +260,128 @@ def train_and_forecast(country_name, steps=24):
     
     return final_df, signal
 
+@timed("model.simulate_paths")
+def simulate_paths(var_result, history, steps, n_paths=5000, seed=None, max_bytes=64 * 2**20, columns=None):
+    """
+    Monte Carlo VAR paths drawn from the fitted residual covariance.
+    All paths of a chunk are propagated together as one (paths x steps x k) tensor;
+    chunks are sized so each stays under `max_bytes`. The draws are consumed in the same
+    order whatever the chunk size, so a given seed yields the same paths under any memory cap.
+    Returns: array (n_paths, steps, len(columns)) for the requested column indices (default: all).
+    """
+    lag_order = var_result.k_ar
+    coefs = np.asarray(var_result.coefs)                     # (p, k, k)
+    intercept = np.asarray(var_result.params)[0]             # (k,)
+    chol = np.linalg.cholesky(np.asarray(var_result.sigma_u))
+    k = len(intercept)
+    columns = list(range(k)) if columns is None else list(columns)
+
+    y0 = np.asarray(history, dtype=float)[len(history) - lag_order:]
+    rng = np.random.default_rng(seed)
+
+    # Shocks + state buffer are the two full-size tensors held per chunk
+    bytes_per_path = 8 * k * (steps + (lag_order + steps))
+    chunk = int(max(1, min(n_paths, max_bytes // bytes_per_path)))
+
+    out = np.empty((n_paths, steps, len(columns)))
+    for first in range(0, n_paths, chunk):
+        n = min(chunk, n_paths - first)
+        shocks = rng.standard_normal((n, steps, k)) @ chol.T
+
+        state = np.empty((n, lag_order + steps, k))
+        state[:, :lag_order] = y0
+        for t in range(steps):
+            y = intercept + shocks[:, t]
+            for lag in range(lag_order):
+                y = y + state[:, lag_order + t - 1 - lag] @ coefs[lag].T
+            state[:, lag_order + t] = y
+
+        out[first:first + n] = state[:, lag_order:, columns]
+    return out
+
+def forecast_intervals(country_name, steps=24, quantiles=(0.05, 0.5, 0.95), n_paths=5000,
+                       seed=None, max_bytes=64 * 2**20, column='FDI_Inflows_MillionUSD'):
+    """
+    Simulated fan chart for one variable: quantiles of `n_paths` VAR paths per forecast month.
+    Returns: DataFrame indexed by forecast date with one column per quantile
+    (empty if the country's data is missing).
+    """
+    train_df, error = load_training_frame(country_name)
+    if error:
+        return pd.DataFrame()
+
+    var_result = fitted_model(country_name, train_df)
+    return assemble_intervals(train_df, var_result, steps, quantiles=quantiles, n_paths=n_paths,
+                              seed=seed, max_bytes=max_bytes, column=column)
+
+def assemble_intervals(train_df, var_result, steps, quantiles=(0.05, 0.5, 0.95), n_paths=5000,
+                       seed=None, max_bytes=64 * 2**20, column='FDI_Inflows_MillionUSD'):
+    """forecast_intervals for a training frame and its fitted VAR (no data reload)."""
+    col_idx = list(train_df.columns).index(column)
+
+    paths = simulate_paths(var_result, train_df.values, steps, n_paths=n_paths, seed=seed,
+                           max_bytes=max_bytes, columns=[col_idx])[:, :, 0]
+
+    forecast_dates = pd.date_range(start=train_df.index[-1], periods=steps+1, freq='M')[1:]
+    bands = np.quantile(paths, quantiles, axis=0).T
+    return pd.DataFrame(bands, index=forecast_dates, columns=list(quantiles))
+
+def _forecast_worker(args):
+    country_name, steps = args
+    return country_name, train_and_forecast(country_name, steps=steps)
+
+def train_and_forecast_many(countries=None, steps=24, max_workers=None):
+    """
+    Fits and forecasts several markets in parallel (one process per core).
+    Defaults to every country in config_countries.csv.
+    Returns: (combined DataFrame with a 'Country' column, {country: signal}).
+    """
+    if countries is None:
+        countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(countries)) or 1
+
+    frames = []
+    signals = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        jobs = [(country_name, steps) for country_name in countries]
+        for country_name, (final_df, signal) in pool.map(_forecast_worker, jobs):
+            signals[country_name] = signal
+            if not final_df.empty:
+                final_df = final_df.copy()
+                final_df['Country'] = country_name
+                frames.append(final_df)
+
+    combined = pd.concat(frames) if frames else pd.DataFrame()
+    return combined, signals
+
+_prewarm_thread = None
+_prewarm_lock = threading.Lock()
+
+def _prewarm(countries):
+    try:
+        if countries is None:
+            countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+        for country_name in countries:
+            train_df, error = load_training_frame(country_name)
+            if not error:
+                fitted_model(country_name, train_df)
+    except Exception as e:
+        print(f"[WARN] Model pre-warm stopped: {e}")
+
+def prewarm(countries=None):
+    """
+    Starts (once per process) a background thread that loads every
+    market's data partition and fits or loads its VAR into model_cache, so the first live
+    forecast skips those cold costs. Returns the thread.
+    """
+    global _prewarm_thread
+    with _prewarm_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target=_prewarm, args=(countries,), name="model-prewarm", daemon=True)
+            _prewarm_thread.start()
+        return _prewarm_thread
+
 # Debugging / Testing block (Only runs if you execute this script directly)
 if __name__ == "__main__":
     print("🧠 Testing VAR Engine on Nigeria...")
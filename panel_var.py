@@ -0,0 +1,184 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from market_data import TICKERS
+from model_engine import (lagged_design, select_lag_order, ols_var, max_lags_for, fit_var,
+                          load_training_frame, assemble_forecast, train_and_forecast, CONFIG_FILE)
+
+# --- CONFIGURATION ---
+DRIVER_COLS = list(TICKERS.values())  # Global block: the same series in every market's slice
+
+
+# 1. POOLING
+def load_panel(countries):
+    """
+    Training frames that can share one driver block: same dates, same columns and identical driver values.
+    Returns (frames, others, errors): poolable {country: train_df}, countries that must be fitted
+    on their own (different sample or drivers), and {country: error_signal} for missing data.
+    """
+    frames, others, errors = {}, [], {}
+    reference = None
+    for country in countries:
+        train_df, error = load_training_frame(country)
+        if error:
+            errors[country] = error
+            continue
+        has_blocks = set(DRIVER_COLS) < set(train_df.columns)  # Drivers plus at least one market variable
+        if not has_blocks:
+            others.append(country)
+            continue
+        if reference is None:
+            reference = train_df
+        elif not (train_df.index.equals(reference.index) and list(train_df.columns) == list(reference.columns)
+                  and np.array_equal(train_df[DRIVER_COLS].values, reference[DRIVER_COLS].values)):
+            others.append(country)
+            continue
+        frames[country] = train_df
+    return frames, others, errors
+
+
+def select_panel_lag_order(values, local_idx, maxlags):
+    """
+    One AIC lag order for the market-specific equations of every country.
+    Same nested-QR scheme as model_engine.select_lag_order, with the QR batched over countries;
+    the criterion is the country-average log det of the local residual covariance.
+    """
+    n_countries, nobs_total, k = values.shape
+    n_local = len(local_idx)
+    if maxlags > (nobs_total - k - 1) // (1 + k):
+        raise ValueError("maxlags is too large for the number of observations.")
+
+    X = np.stack([lagged_design(v, maxlags) for v in values])
+    Y = values[:, maxlags:, local_idx]
+    Q, R = np.linalg.qr(X[:, maxlags:])
+    QtY = Q.transpose(0, 2, 1) @ Y
+    resid = Y - Q @ QtY
+    sse = resid.transpose(0, 2, 1) @ resid
+    nobs = Y.shape[1]
+
+    aic = []
+    for p in range(maxlags, -1, -1):
+        if p < maxlags:
+            dropped = QtY[:, 1 + k * p:1 + k * (p + 1)]
+            sse = sse + dropped.transpose(0, 2, 1) @ dropped
+        chol = np.linalg.cholesky(sse / nobs)
+        ld = 2 * np.log(np.diagonal(chol, axis1=1, axis2=2)).sum(axis=1).mean()
+        aic.append(ld + (2.0 / nobs) * (p * k * n_local + n_local))
+    return int(np.argmin(aic[::-1]))
+
+
+# 2. FITTING
+def fit_panel(frames):
+    """
+    Pooled panel VAR for frames from load_panel:
+      - driver block (DRIVER_COLS): one VAR on the shared drivers, fitted once;
+      - market block (every other column): each country's equations on its own lags and the driver lags,
+        all countries solved together as one batched least-squares problem with a shared lag order.
+    Returns a dict with the countries, columns, lag orders and per-country full VAR params
+    (rows: [const, lag 1 block, ..., lag p block], as model_engine.ols_var).
+    """
+    countries = list(frames)
+    reference = frames[countries[0]]
+    columns = list(reference.columns)
+    k = len(columns)
+    driver_idx = [columns.index(c) for c in DRIVER_COLS]
+    local_idx = [i for i in range(k) if i not in driver_idx]
+    values = np.stack([frames[c].values.astype(float) for c in countries])  # (countries, T, k)
+    maxlags = max_lags_for(values.shape[1])
+
+    # Driver block: fitted once, whatever the number of markets
+    drivers = values[0][:, driver_idx]
+    try:
+        driver_lag = select_lag_order(drivers, maxlags)[0]['aic']
+    except (ValueError, np.linalg.LinAlgError):
+        driver_lag = 1
+    driver_params = ols_var(drivers, driver_lag)[0]
+
+    # Market block: one batched QR + triangular solve over every country
+    try:
+        lag_order = select_panel_lag_order(values, local_idx, maxlags)
+    except (ValueError, np.linalg.LinAlgError):
+        lag_order = 1
+    X = np.stack([lagged_design(v, lag_order) for v in values])[:, lag_order:]
+    Q, R = np.linalg.qr(X)
+    local_params = np.linalg.solve(R, Q.transpose(0, 2, 1) @ values[:, lag_order:, local_idx])
+
+    # Both blocks as one VAR(P) per country, so forecasting is a single recursion
+    order = max(1, lag_order, driver_lag)
+    params = np.zeros((len(countries), 1 + k * order, k))
+    params[:, :1 + k * lag_order][:, :, local_idx] = local_params
+    n_drivers = len(driver_idx)
+    params[:, 0, driver_idx] = driver_params[0]
+    for lag in range(driver_lag):
+        block = driver_params[1 + n_drivers * lag:1 + n_drivers * (lag + 1)]
+        for row, i in zip(block, driver_idx):
+            params[:, 1 + k * lag + i, driver_idx] = row  # Drivers never load on market lags
+
+    return {
+        'countries': countries, 'columns': columns, 'params': params, 'lag_order': order,
+        'market_lag_order': lag_order, 'driver_lag_order': driver_lag,
+    }
+
+
+# 3. FORECASTING
+def panel_var_forecast(params, histories, lag_order, steps):
+    """model_engine.var_forecast for every country at once: params (C, m, k), histories (C, T, k) -> (C, steps, k)."""
+    n_countries, _, k = params.shape
+    intercept = params[:, 0]
+    coefs = params[:, 1:].reshape(n_countries, lag_order, k, k)
+
+    state = np.empty((n_countries, lag_order + steps, k))
+    state[:, :lag_order] = histories[:, histories.shape[1] - lag_order:]
+    for t in range(steps):
+        y = intercept.copy()
+        for lag in range(lag_order):
+            y += np.einsum('ci,cij->cj', state[:, lag_order + t - 1 - lag], coefs[:, lag])
+        state[:, lag_order + t] = y
+    return state[:, lag_order:]
+
+
+def panel_forecast(countries=None, steps=24):
+    """
+    Pooled counterpart of calling model_engine.train_and_forecast per country.
+    Returns {country: (final_df, signal)}; markets that cannot be pooled are fitted on their own.
+    """
+    if countries is None:
+        countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+
+    frames, others, errors = load_panel(countries)
+    results = {country: (pd.DataFrame(), error) for country, error in errors.items()}
+    if frames:
+        panel = fit_panel(frames)
+        histories = np.stack([frames[c].values.astype(float) for c in panel['countries']])
+        forecasts = panel_var_forecast(panel['params'], histories, panel['lag_order'], steps)
+        for country, forecast in zip(panel['countries'], forecasts):
+            results[country] = assemble_forecast(frames[country], forecast)
+    for country in others:
+        print(f"[WARN] {country}: sample or drivers differ from the panel; fitted separately.")
+        results[country] = train_and_forecast(country, steps=steps)
+    return {country: results[country] for country in countries}
+
+
+# Comparison block: pooled vs per-country fits on the current dataset
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pooled panel VAR vs one VAR per market.")
+    parser.add_argument("--steps", type=int, default=24)
+    args = parser.parse_args()
+
+    countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+    frames, _, _ = load_panel(countries)
+    fit_var(next(iter(frames.values())))  # Untimed warm-up: first-call imports and allocations stay out of the timings
+
+    start = time.perf_counter()
+    panel = fit_panel(frames)
+    pooled = time.perf_counter() - start
+    start = time.perf_counter()
+    for train_df in frames.values():
+        fit_var(train_df)
+    separate = time.perf_counter() - start
+
+    print(f"🧮 Pooled fit for {len(frames)} markets: {pooled * 1e3:.1f} ms vs {separate * 1e3:.1f} ms separately")
+    print(f"[INFO] Lag orders: market block {panel['market_lag_order']}, driver block {panel['driver_lag_order']}")
+    for country, (final_df, signal) in panel_forecast(countries, steps=args.steps).items():
+        print(f"   {country:<14} {signal}")
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import uuid
+import subprocess
+import threading
+
+# --- CONFIGURATION ---
+GENERATOR_SCRIPT = "data_generator.py"
+MATERIALIZE_SCRIPT = "forecast_store.py"  # Precomputes dashboard forecasts once the new data is published
+MAX_LOG_LINES = 200
+
+# Progress milestones, matched against data_generator's console output
+PROGRESS_MARKERS = [
+    ("Loading Country Profiles", 0.10, "Loading country profiles..."),
+    ("Connecting to Yahoo Finance", 0.20, "Fetching market drivers..."),
+    ("Driver cache updated", 0.50, "Market drivers updated."),
+    ("Real Data Acquired", 0.60, "Generating dataset..."),
+    ("already up to date", 0.80, "Dataset already up to date."),
+    ("Appended", 0.75, "Publishing new months..."),
+    ("Dataset Generated", 0.80, "Publishing new dataset version..."),
+    ("Materializing forecasts", 0.85, "Precomputing forecasts..."),
+    ("Stored", 0.90, "Precomputing forecasts..."),
+]
+
+_lock = threading.Lock()
+_current = None  # Latest job in this process (shared by every dashboard session)
+
+
+class RefreshJob:
+    """
+    One background run of data_generator.py, then forecast_store.py (if present),
+    with progress parsed from their output.
+    """
+
+    def __init__(self, script_path):
+        self.job_id = uuid.uuid4().hex[:8]
+        self.script_path = script_path
+        self.materialize_path = os.path.join(os.path.dirname(script_path), MATERIALIZE_SCRIPT)
+        self.status = "running"      # running -> succeeded | failed
+        self.progress = 0.0
+        self.message = "Starting data refresh..."
+        self.log = []
+        self.started_at = time.time()
+        self.finished_at = None
+        self._thread = threading.Thread(target=self._run, name=f"refresh-{self.job_id}", daemon=True)
+
+    @property
+    def running(self):
+        return self.status == "running"
+
+    def _run_script(self, path):
+        """Runs one script to completion, following its output. Returns the exit code."""
+        proc = subprocess.Popen(
+            [sys.executable, "-u", path],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+        for line in proc.stdout:
+            line = line.rstrip()
+            self.log = (self.log + [line])[-MAX_LOG_LINES:]
+            for marker, progress, message in PROGRESS_MARKERS:
+                if marker in line:
+                    self.progress, self.message = max(self.progress, progress), message
+        return proc.wait()
+
+    def _run(self):
+        try:
+            if self._run_script(self.script_path) != 0:
+                self.status, self.message = "failed", "Error updating data."
+            elif os.path.exists(self.materialize_path) and self._run_script(self.materialize_path) != 0:
+                # The new data is already published: the dashboard falls back to live forecasts
+                self.status, self.progress = "succeeded", 1.0
+                self.message = "Data Updated (forecast precompute failed; using live models)."
+            else:
+                self.status, self.progress, self.message = "succeeded", 1.0, "Data Updated Successfully!"
+        except OSError as e:
+            self.log.append(str(e))
+            self.status, self.message = "failed", f"Could not start refresh: {e}"
+        finally:
+            self.finished_at = time.time()
+
+
+def start_refresh(script_path=None):
+    """
+    Starts a background refresh, or joins the one already running.
+    Returns (job, joined) where joined is True if an existing job was reused.
+    """
+    global _current
+    script_path = script_path or os.path.join(os.getcwd(), GENERATOR_SCRIPT)
+    if not os.path.exists(script_path):
+        raise FileNotFoundError(f"Script not found at: {script_path}")
+
+    with _lock:
+        if _current is not None and _current.running:
+            return _current, True
+        _current = RefreshJob(script_path)
+        _current._thread.start()
+        return _current, False
+
+
+def current_job():
+    """The most recent refresh job in this process (None if none was started)."""
+    return _current
@@ -0,0 +1,270 @@
+import os
+import json
+import hashlib
+import argparse
+import datetime
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from model_engine import train_and_forecast, CONFIG_FILE
+import data_store
+from instrumentation import timed
+
+# --- CONFIGURATION ---
+REPORTS_DIR = "reports"
+MANIFEST_FILE = "manifest.json"
+HORIZONS = [12, 24, 36, 60]
+REPORT_VERSION = 1  # Bump when the PDF layout or narrative changes, so every report is re-rendered
+
+# --- PDF GENERATION CLASS ---
+# Defined on first use, so importing this module (e.g. from the dashboard) does not load fpdf
+@functools.lru_cache(maxsize=None)
+def pdf_class():
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def header(self):
+            self.set_font('Arial', 'B', 12)
+            self.cell(0, 10, 'African Capital Flow Engine - Executive Summary', 0, 1, 'C')
+            self.ln(10)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+    return PDF
+
+# --- NARRATIVE ENGINE ---
+def executive_narrative(country, delta, oil_corr):
+    """Momentum / stance classification and the narrative text. Returns (stance, analysis, recommendation)."""
+    # --- INTELLIGENCE ENGINE ---
+    if delta > 100:
+        momentum, stance = "extraordinary surge", "AGGRESSIVE EXPANSION"
+    elif delta > 20:
+        momentum, stance = "strong upward trend", "STRATEGIC ACCELERATION"
+    elif delta > 0:
+        momentum, stance = "stable recovery", "CAUTIOUS OPTIMISM"
+    elif delta > -20:
+        momentum, stance = "mild contraction", "PORTFOLIO CONSOLIDATION"
+    else:
+        momentum, stance = "significant downturn", "DEFENSIVE DE-RISKING"
+
+    # --- NARRATIVE GENERATOR ---
+    analysis = f"The {country} capital flow engine is currently detecting a {momentum}. "
+    
+    if country in ["Zimbabwe", "South Africa"]:
+        analysis += f"Mineral pricing (Gold/Platinum) remains the primary support pillar, providing a buffer against local currency instability. "
+    elif abs(oil_corr) > 0.6:
+        impact = "benefit" if oil_corr > 0 else "volatility"
+        analysis += f"The high correlation with global energy markets ({oil_corr:.2f}) suggests that portfolio performance will track {impact} in the crude sector. "
+
+    recommendation = f"Our executive stance is {stance}. "
+    if "DE-RISKING" in stance:
+        recommendation += "Halt all non-essential CapEx and increase cash reserves."
+    elif "EXPANSION" in stance:
+        recommendation += "Leverage current liquidity to acquire prime distressed assets or fast-track ongoing developments."
+    else:
+        recommendation += "Focus on tenant retention and protecting USD-equivalent yields."
+
+    return stance, analysis, recommendation
+
+# --- ENHANCED PDF GENERATION ---
+@timed("report.create_pdf")
+def create_pdf(country, current_fdi, predicted_fdi, delta, signal, oil_corr, df):
+    """Executive summary PDF for one market. `df` needs a 'Type' column (History/Forecast). Returns bytes."""
+    pdf = pdf_class()()
+    pdf.add_page()
+    
+    clean_signal = signal.replace("🔥", "").replace("❄️", "").strip()
+    forecast = df[df['Type'] == 'Forecast']
+    
+    stance, analysis, recommendation = executive_narrative(country, delta, oil_corr)
+
+    # --- PDF DRAWING ---
+    pdf.set_font("Arial", "B", 18)
+    pdf.cell(0, 10, f"Market Intelligence: {country}", 0, 1)
+    pdf.set_font("Arial", "I", 10)
+    pdf.cell(0, 10, f"Horizon: {len(forecast)} Months | Delta: {delta:+.1f}%", 0, 1)
+    pdf.ln(5)
+
+    pdf.set_fill_color(240, 240, 240)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, " Strategic Executive Summary", 1, 1, 'L', fill=True)
+    pdf.set_font("Arial", "", 11)
+    pdf.multi_cell(0, 8, f"\nAnalysis: {analysis}\n\nRecommendation: {recommendation}\n")
+    
+    # KPI Table
+    pdf.ln(5)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, " Key Performance Indicators", 1, 1, 'L', fill=True)
+    pdf.set_font("Arial", "", 10)
+    
+    pdf.cell(90, 10, "Annualized Run-Rate (Current)", 1)
+    pdf.cell(90, 10, f"${current_fdi:,.1f} M", 1, 1)
+    
+    pdf.cell(90, 10, "Projected Annual Inflow", 1)
+    pdf.cell(90, 10, f"${predicted_fdi:,.1f} M", 1, 1)
+    
+    pdf.cell(90, 10, "Forecast Period Change (Delta)", 1)
+    pdf.cell(90, 10, f"{delta:+.1f}%", 1, 1)
+    
+    pdf.cell(90, 10, "Oil Price Sensitivity (Correlation)", 1)
+    pdf.cell(90, 10, f"{oil_corr:.2f}", 1, 1)
+    
+    pdf.cell(90, 10, "Model Signal Strength", 1)
+    pdf.cell(90, 10, f"{clean_signal}", 1, 1)
+    pdf.ln(10)
+
+    # 6-Month Projected Cash-Flow Intensity Table
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, " 6-Month Projected Cash-Flow Intensity", 1, 1, 'L', fill=True)
+    
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(90, 10, "Month", 1, 0, 'C')
+    pdf.cell(90, 10, "Inflow Intensity (USD M)", 1, 1, 'C')
+    
+    pdf.set_font("Arial", "", 10)
+    short_term = forecast.head(6)
+    for index, row in short_term.iterrows():
+        month_str = index.strftime('%B %Y')
+        val = row['FDI_Inflows_MillionUSD']
+        pdf.cell(90, 10, f" {month_str}", 1)
+        pdf.cell(90, 10, f"${val:,.2f}", 1, 1, 'R')
+    
+    return pdf.output(dest='S').encode('latin-1', 'replace')
+
+
+# --- KPI INPUTS ---
+def report_kpis(df):
+    """
+    KPI inputs for create_pdf from a train_and_forecast frame (same definitions as the dashboard).
+    Returns (current_fdi, predicted_fdi, delta, oil_corr, forecast).
+    """
+    history = df[df['Type'] == 'History']
+    forecast = df[df['Type'] == 'Forecast']
+
+    # Multiply by 12 to get the Annual Run-Rate
+    current_fdi = history['FDI_Inflows_MillionUSD'].iloc[-1] * 12
+
+    if not forecast.empty:
+        predicted_fdi = forecast['FDI_Inflows_MillionUSD'].iloc[-1] * 12
+        delta = ((predicted_fdi - current_fdi) / current_fdi) * 100
+    else:
+        # No forecast rows (e.g. cache mode): "safe" numbers instead of an IndexError
+        predicted_fdi = current_fdi
+        delta = 0.0
+
+    oil_corr = df['FDI_Inflows_MillionUSD'].corr(df['Oil_Price'])
+    return current_fdi, predicted_fdi, delta, oil_corr, forecast
+
+
+def input_hash(country, current_fdi, predicted_fdi, delta, signal, oil_corr, forecast):
+    """Hash of everything create_pdf renders, so unchanged reports can be skipped."""
+    h = hashlib.sha256(repr((REPORT_VERSION, country, float(current_fdi), float(predicted_fdi),
+                             float(delta), signal, float(oil_corr))).encode())
+    h.update(pd.util.hash_pandas_object(forecast, index=True).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+# --- BATCH GENERATION ---
+def report_file_name(country, horizon):
+    return f"{country}_Market_Intelligence_Report_{horizon}m.pdf"
+
+
+def _load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {(r['country'], r['horizon']): r for r in json.load(f).get('reports', [])}
+
+
+def _report_worker(args):
+    """
+    Renders every horizon for one country. All horizons share the country's fitted model
+    (model_cache), so the VAR is fitted at most once per country and dataset version.
+    """
+    country, horizons, out_dir, previous = args
+    records = []
+    for horizon in horizons:
+        record = {'country': country, 'horizon': horizon, 'file': report_file_name(country, horizon)}
+        df, signal = train_and_forecast(country, steps=horizon)
+        if df.empty:
+            records.append({**record, 'status': 'failed', 'error': signal})
+            continue
+
+        current_fdi, predicted_fdi, delta, oil_corr, forecast = report_kpis(df)
+        digest = input_hash(country, current_fdi, predicted_fdi, delta, signal, oil_corr, forecast)
+        path = os.path.join(out_dir, record['file'])
+        record.update({'input_hash': digest, 'signal': signal, 'delta_pct': round(float(delta), 2)})
+
+        old = previous.get((country, horizon))
+        if old is not None and old.get('input_hash') == digest and os.path.exists(path):
+            records.append({**record, 'status': 'unchanged', 'bytes': os.path.getsize(path)})
+            continue
+
+        pdf_bytes = create_pdf(country, current_fdi, predicted_fdi, delta, signal, oil_corr, forecast)
+        with open(path + ".tmp", "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(path + ".tmp", path)
+        records.append({**record, 'status': 'written', 'bytes': len(pdf_bytes)})
+    return records
+
+
+def generate_reports(countries=None, horizons=HORIZONS, out_dir=REPORTS_DIR, max_workers=None, force=False):
+    """
+    Writes an executive PDF per (country, horizon) into `out_dir`, one worker process per country,
+    plus manifest.json describing every report in the folder. Reports whose input hash matches the
+    previous manifest are left untouched (`force` re-renders everything).
+    Returns the manifest dict.
+    """
+    if countries is None:
+        countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+    os.makedirs(out_dir, exist_ok=True)
+    last_run = _load_manifest(out_dir)
+    previous = {} if force else last_run
+    # Reports from earlier runs that are not part of this one stay listed while their file exists
+    known = {key: {**rec, 'status': 'kept'} for key, rec in last_run.items()
+             if os.path.exists(os.path.join(out_dir, rec['file']))}
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(countries)) or 1
+    jobs = [(country, list(horizons), out_dir, previous) for country in countries]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for country_records in pool.map(_report_worker, jobs):
+            known.update({(rec['country'], rec['horizon']): rec for rec in country_records})
+
+    records = [known[key] for key in sorted(known)]
+
+    manifest = {
+        'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'dataset_version': data_store.dataset_version(),
+        'report_version': REPORT_VERSION,
+        'reports': records,
+    }
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch executive report generation for all markets.")
+    parser.add_argument("--countries", nargs="+", default=None, help="Markets to render (default: config_countries.csv).")
+    parser.add_argument("--horizons", nargs="+", type=int, default=HORIZONS, help="Forecast horizons in months.")
+    parser.add_argument("--out-dir", default=REPORTS_DIR, help="Output folder for the PDFs and manifest.json.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core).")
+    parser.add_argument("--force", action="store_true", help="Re-render every report even if its inputs are unchanged.")
+    args = parser.parse_args()
+
+    print("📄 Generating executive reports...")
+    manifest = generate_reports(args.countries, args.horizons, args.out_dir, args.workers, args.force)
+    for status in ('written', 'unchanged', 'kept', 'failed'):
+        count = sum(r['status'] == status for r in manifest['reports'])
+        if count:
+            print(f"[INFO] {status.capitalize()}: {count}")
+    for r in manifest['reports']:
+        if r['status'] == 'failed':
+            print(f"[ERROR] {r['country']} ({r['horizon']}m): {r['error']}")
+    print(f"[SUCCESS] Manifest written to {os.path.join(args.out_dir, MANIFEST_FILE)}")
@@ -0,0 +1,153 @@
+import itertools
+import numpy as np
+import pandas as pd
+from model_engine import load_training_frame, fitted_model, CONFIG_FILE
+
+# --- CONFIGURATION ---
+# Global commodity drivers that scenarios may shock (fractional level shifts, e.g. -0.30 = -30%)
+DRIVERS = ['Oil_Price', 'Gold_Price', 'Platinum_Price', 'USD_Index']
+TARGET = 'FDI_Inflows_MillionUSD'
+BATCH_SIZE = 4096  # Scenarios propagated together per country
+
+
+def build_grid(**shocks):
+    """
+    Cartesian grid of driver shocks, e.g. build_grid(Oil_Price=[-0.3, 0, 0.3], USD_Index=[-0.1, 0.1]).
+    Drivers not mentioned stay at 0. Returns a DataFrame indexed by 'Scenario'.
+    """
+    unknown = set(shocks) - set(DRIVERS)
+    if unknown:
+        raise ValueError(f"Unknown drivers: {sorted(unknown)}. Allowed: {DRIVERS}")
+
+    names = list(shocks)
+    grid = pd.DataFrame(list(itertools.product(*shocks.values())), columns=names)
+    for driver in DRIVERS:
+        if driver not in grid.columns:
+            grid[driver] = 0.0
+    grid = grid[DRIVERS].astype(float)
+    grid.index.name = 'Scenario'
+    return grid
+
+
+def conditional_paths(var_result, history, steps, driver_idx, driver_paths):
+    """
+    Conditional VAR forecasts for a batch of scenarios.
+    The driver columns are pinned to `driver_paths` (scenarios x steps x drivers) at every step,
+    and the remaining variables respond through the fitted coefficient matrices.
+    Returns: array (scenarios, steps, k).
+    """
+    lag_order = var_result.k_ar
+    coefs = np.asarray(var_result.coefs)               # (p, k, k)
+    intercept = np.asarray(var_result.params)[0]       # (k,)
+    n_scen = driver_paths.shape[0]
+
+    state = np.empty((n_scen, lag_order + steps, len(intercept)))
+    state[:, :lag_order] = np.asarray(history, dtype=float)[len(history) - lag_order:]
+    for t in range(steps):
+        y = np.broadcast_to(intercept, (n_scen, len(intercept))).copy()
+        for lag in range(lag_order):
+            y += state[:, lag_order + t - 1 - lag] @ coefs[lag].T
+        y[:, driver_idx] = driver_paths[:, t]
+        state[:, lag_order + t] = y
+    return state[:, lag_order:]
+
+
+def run_sweep(grid, countries=None, steps=24):
+    """
+    Evaluates every scenario in `grid` for every country against the cached fitted VARs.
+    Each scenario scales the baseline (unconditional) driver forecast by (1 + shock).
+    Returns (cube, summary):
+      cube    -> long-format frame: Scenario, Country, Date + every model variable
+      summary -> one row per (Scenario, Country): current/predicted annualised FDI, delta %, signal
+    """
+    if countries is None:
+        countries = pd.read_csv(CONFIG_FILE)['Country'].tolist()
+
+    cubes = []
+    summaries = []
+    for country_name in countries:
+        train_df, error = load_training_frame(country_name)
+        if error:
+            print(f"[WARN] Skipping {country_name}: {error}")
+            continue
+
+        var_result = fitted_model(country_name, train_df)
+        cols = list(train_df.columns)
+        history = train_df.values
+        drivers = [d for d in DRIVERS if d in cols]
+        driver_idx = [cols.index(d) for d in drivers]
+        target_idx = cols.index(TARGET)
+
+        lag_order = var_result.k_ar
+        baseline = var_result.forecast(y=history[len(history) - lag_order:], steps=steps)
+        forecast_dates = pd.date_range(start=train_df.index[-1], periods=steps+1, freq='M')[1:]
+
+        # KPI inputs shared by every scenario (same definitions as the dashboard)
+        current_fdi = history[-1, target_idx] * 12
+        avg_hist = history[-12:, target_idx].mean()
+
+        for first in range(0, len(grid), BATCH_SIZE):
+            batch = grid.iloc[first:first + BATCH_SIZE]
+            factors = 1.0 + batch[drivers].values                             # (S, d)
+            driver_paths = baseline[None, :, driver_idx] * factors[:, None, :]  # (S, steps, d)
+            paths = conditional_paths(var_result, history, steps, driver_idx, driver_paths)
+
+            n_scen = len(batch)
+            cube = pd.DataFrame(paths.reshape(n_scen * steps, len(cols)), columns=cols)
+            cube.insert(0, 'Date', np.tile(forecast_dates, n_scen))
+            cube.insert(0, 'Country', country_name)
+            cube.insert(0, 'Scenario', np.repeat(batch.index.values, steps))
+            cubes.append(cube)
+
+            predicted_fdi = paths[:, -1, target_idx] * 12
+            heating = paths[:, :12, target_idx].mean(axis=1) > avg_hist
+            summaries.append(pd.DataFrame({
+                'Scenario': batch.index.values,
+                'Country': country_name,
+                'Current_FDI': current_fdi,
+                'Predicted_FDI': predicted_fdi,
+                'Delta_Pct': (predicted_fdi - current_fdi) / current_fdi * 100,
+                'Signal': np.where(heating, "🔥 HEATING UP", "❄️ COOLING DOWN"),
+            }))
+
+    if not cubes:
+        return pd.DataFrame(), pd.DataFrame()
+
+    summary = pd.concat(summaries, ignore_index=True).merge(grid.reset_index(), on='Scenario')
+    return pd.concat(cubes, ignore_index=True), summary
+
+
+def report_inputs(cube, summary, country_name, scenario):
+    """
+    Arguments for report_engine.create_pdf describing one scenario for one country, so the existing
+    executive narrative can be rendered for any point of the sweep.
+    """
+    train_df, error = load_training_frame(country_name)
+    if error:
+        raise ValueError(f"{country_name}: {error}")
+
+    row = summary[(summary['Scenario'] == scenario) & (summary['Country'] == country_name)].iloc[0]
+    forecast_df = cube[(cube['Scenario'] == scenario) & (cube['Country'] == country_name)]
+    forecast_df = forecast_df.drop(columns=['Scenario', 'Country']).set_index('Date')
+    forecast_df['Type'] = 'Forecast'
+
+    history_df = train_df.copy()
+    history_df['Type'] = 'History'
+    combined = pd.concat([history_df, forecast_df])
+
+    return {
+        'country': country_name,
+        'current_fdi': row['Current_FDI'],
+        'predicted_fdi': row['Predicted_FDI'],
+        'delta': row['Delta_Pct'],
+        'signal': row['Signal'],
+        'oil_corr': combined[TARGET].corr(combined['Oil_Price']),
+        'df': forecast_df,
+    }
+
+
+if __name__ == "__main__":
+    print("🧪 Running commodity shock sweep: Oil ±30% x USD ±10% across all markets...")
+    grid = build_grid(Oil_Price=np.linspace(-0.3, 0.3, 7), USD_Index=np.linspace(-0.1, 0.1, 5))
+    cube, summary = run_sweep(grid, steps=24)
+    print(summary.pivot_table(index=['Oil_Price', 'USD_Index'], columns='Country', values='Delta_Pct').round(1))
@@ -0,0 +1,31 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import model_engine  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """Data paths are relative to the repository root."""
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture(scope="session")
+def countries():
+    import pandas as pd
+    return pd.read_csv(os.path.join(ROOT, model_engine.CONFIG_FILE))['Country'].tolist()
+
+
+@pytest.fixture(scope="session")
+def train_frames(countries):
+    """{country: train_df} from the bundled dataset."""
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        return {c: model_engine.load_training_frame(c)[0] for c in countries}
+    finally:
+        os.chdir(cwd)
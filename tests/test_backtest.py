@@ -0,0 +1,23 @@
+import glob
+import os
+import pandas as pd
+from backtest import run_backtest
+
+
+def test_resumed_run_gives_identical_metrics(tmp_path, countries):
+    kwargs = dict(countries=countries[:2], horizon=6, min_train=120, step=6, max_workers=1)
+    metrics, hit_rates = run_backtest(results_dir=str(tmp_path / "full"), **kwargs)
+
+    # Interrupted run: the first half of the records plus a half-written one
+    resume_dir = tmp_path / "resume"
+    os.makedirs(resume_dir)
+    [full_store] = glob.glob(str(tmp_path / "full" / "*.jsonl"))
+    with open(full_store, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(resume_dir / os.path.basename(full_store), "w", encoding="utf-8") as f:
+        f.writelines(lines[:len(lines) // 2])
+        f.write(lines[len(lines) // 2][:20])
+
+    resumed_metrics, resumed_hits = run_backtest(results_dir=str(resume_dir), **kwargs)
+    pd.testing.assert_frame_equal(resumed_metrics.sort_index(), metrics.sort_index())
+    pd.testing.assert_series_equal(resumed_hits.sort_index(), hit_rates.sort_index())
@@ -0,0 +1,12 @@
+import pandas as pd
+import data_generator
+
+
+def test_generate_panel_reproduces_bundled_csv():
+    bundled = pd.read_csv(data_generator.OUTPUT_FILE, parse_dates=['Date'])
+    config_df = data_generator.load_profiles()
+    # The CSV carries the driver closes it was generated from (identical for every country)
+    drivers = bundled[bundled['Country'] == config_df['Country'][0]].set_index('Date')[data_generator.DRIVER_COLS]
+
+    panel = data_generator.generate_panel(data_generator.prepare_drivers(drivers.copy()), config_df)
+    pd.testing.assert_frame_equal(panel.reset_index(drop=True), bundled, check_exact=False, rtol=1e-9)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from statsmodels.tsa.api import VAR
+from model_engine import select_lag_order, ols_var, max_lags_for
+
+
+@pytest.mark.filterwarnings("ignore")
+def test_fast_lag_selection_matches_statsmodels(train_frames):
+    for country, train_df in train_frames.items():
+        maxlags = max_lags_for(len(train_df))
+        selected, ics = select_lag_order(train_df.values.astype(float), maxlags)
+        reference = VAR(train_df).select_order(maxlags=maxlags)
+
+        for name in ('aic', 'bic', 'hqic'):
+            assert selected[name] == reference.selected_orders[name], (country, name)
+            np.testing.assert_allclose(ics[name], reference.ics[name], rtol=1e-8, err_msg=country)
+
+
+@pytest.mark.filterwarnings("ignore")
+def test_ols_var_matches_statsmodels_fit(train_frames):
+    train_df = next(iter(train_frames.values()))
+    params, sigma_u = ols_var(train_df.values.astype(float), 2)
+    reference = VAR(train_df).fit(2)
+
+    np.testing.assert_allclose(params, reference.params.values, rtol=1e-7, atol=1e-9)
+    np.testing.assert_allclose(sigma_u, reference.sigma_u.values, rtol=1e-7)
@@ -0,0 +1,19 @@
+import numpy as np
+from model_engine import lagged_design
+from panel_var import load_panel, fit_panel, DRIVER_COLS
+
+
+def test_local_coefficients_match_per_country_ols(countries):
+    frames, _, _ = load_panel(countries)
+    assert len(frames) > 1
+    panel = fit_panel(frames)
+
+    p = panel['market_lag_order']
+    k = len(panel['columns'])
+    local_idx = [i for i, c in enumerate(panel['columns']) if c not in DRIVER_COLS]
+    for i, country in enumerate(panel['countries']):
+        values = frames[country].values.astype(float)
+        X = lagged_design(values, p)[p:]
+        expected = np.linalg.lstsq(X, values[p:, local_idx], rcond=None)[0]
+        local = panel['params'][i][:1 + k * p][:, local_idx]
+        np.testing.assert_allclose(local, expected, rtol=1e-6, atol=1e-8, err_msg=country)
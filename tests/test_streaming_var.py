@@ -0,0 +1,23 @@
+import numpy as np
+from model_engine import ols_var, var_forecast
+from streaming_var import StreamingVAR
+
+
+def test_rls_updates_match_full_refit(train_frames):
+    values = next(iter(train_frames.values())).values.astype(float)
+    stream = StreamingVAR(values[:-36], relag_every=None)
+    stream.append(values[-36:])
+
+    params, sigma_u = ols_var(values, stream.k_ar)
+    np.testing.assert_allclose(stream.params, params, rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(stream.sigma_u, sigma_u, rtol=1e-6)
+    np.testing.assert_allclose(stream.forecast(24), var_forecast(params, values, stream.k_ar, 24), rtol=1e-6)
+
+
+def test_scheduled_relag_rebuilds_from_full_history(train_frames):
+    values = next(iter(train_frames.values())).values.astype(float)
+    stream = StreamingVAR(values[:-12], relag_every=12)
+    stream.append(values[-12:])
+
+    assert stream.relags == 2
+    np.testing.assert_allclose(stream.params, ols_var(values, stream.k_ar)[0], rtol=1e-9, atol=1e-9)